@@ -0,0 +1,70 @@
+"""
+Summaries of a score series for charts, at a constant size whatever the time range:
+- bucket_stats: per time bucket, count / min / max / mean score & anomaly count
+- lttb: Largest-Triangle-Three-Buckets downsampling, keeps the points that shape
+  the curve (spikes included) instead of averaging them away
+"""
+
+import numpy as np
+
+# the output of bucket_stats (and ScoreStore.aggregate), 1 array per column
+AGGREGATE_COLUMNS: tuple[str, ...] = (
+    "timestamp",  # start of the bucket, ns since epoch
+    "count",
+    "min_score",
+    "max_score",
+    "mean_score",
+    "anomalies",
+)
+
+
+def bucket_stats(
+    timestamps: np.ndarray,
+    scores: np.ndarray,
+    is_anomaly: np.ndarray,
+    bucket_ns: int,
+) -> dict[str, np.ndarray]:
+    """
+    aggregates events (sorted by timestamp) into buckets of bucket_ns
+    output: 1 array per AGGREGATE_COLUMNS, 1 row per non-empty bucket
+    """
+    if not len(timestamps):
+        return {name: np.array([]) for name in AGGREGATE_COLUMNS}
+    buckets = timestamps // bucket_ns
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    count = np.diff(np.r_[starts, len(buckets)])
+    return {
+        "timestamp": buckets[starts] * bucket_ns,
+        "count": count,
+        "min_score": np.minimum.reduceat(scores, starts),
+        "max_score": np.maximum.reduceat(scores, starts),
+        "mean_score": np.add.reduceat(scores, starts) / count,
+        "anomalies": np.add.reduceat(is_anomaly.astype(np.int64), starts),
+    }
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    indices of the n_out points (sorted by x) that best keep the shape of y(x)
+    1st & last points are kept; in each of the n_out - 2 buckets in between, the
+    point forming the largest triangle with the previous pick & the next bucket's mean
+    """
+    n: int = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x - x[0], dtype=np.float64)  # ns since epoch don't fit a float64
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    keep = np.empty(n_out, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    a: int = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs(
+            (x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
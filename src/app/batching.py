@@ -0,0 +1,143 @@
+"""
+Micro-batching for POST /score (used by main.py when BATCH_WINDOW_MS > 0)
+concurrent requests are queued on the event loop, gathered into 1 batch and scored
+with 1 vectorized inference call (in a worker thread, or through `run`, e.g. the
+inference executor), then every caller gets its own row of the result back through
+an asyncio future
+"""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+
+import numpy as np
+
+# features -> (is_anomaly, scores, model version)
+ScoreBatch = Callable[[np.ndarray], tuple[np.ndarray, np.ndarray, int]]
+# a queued row: (features, arrival time, its (is_anomaly, score, version) to come)
+Pending = tuple[np.ndarray, float, asyncio.Future[tuple[bool, float, int]]]
+# (score_batch, features) -> its result, run off the event loop
+RunBatch = Callable[
+    [ScoreBatch, np.ndarray], Awaitable[tuple[np.ndarray, np.ndarray, int]]
+]
+
+
+async def run_in_thread(
+    score_batch: ScoreBatch, features: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, int]:
+    """the default RunBatch: a thread of asyncio's default executor"""
+    return await asyncio.to_thread(score_batch, features)
+
+
+class MicroBatcher:
+    """
+    gathers single rows into batches of at most max_size
+    adaptive: after the 1st row of a batch, it only waits (up to window_ms) for more
+    rows if requests have recently been arriving faster than the window,
+    so a lone request under light load is scored straight away
+    """
+
+    def __init__(
+        self,
+        score_batch: ScoreBatch,
+        window_ms: float,
+        max_size: int,
+        run: RunBatch = run_in_thread,
+    ):
+        self.score_batch = score_batch
+        self.run = run
+        self.window: float = window_ms / 1_000
+        self.max_size = max_size
+        self._queue: asyncio.Queue[Pending] = asyncio.Queue()
+        self._task: asyncio.Task[None] | None = None
+        self._last_arrival: float = 0.0
+        self._gap: float = float("inf")  # moving average of inter-arrival time
+        # statistics, for /status
+        self.n_batches: int = 0
+        self.n_rows: int = 0
+        self.max_batch: int = 0
+        self.total_wait: float = 0.0  # time rows spent queued before scoring
+        self.max_wait: float = 0.0
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, row: np.ndarray) -> tuple[bool, float, int]:
+        """queues 1 feature row, returns its (is_anomaly, score, version) once scored"""
+        now = time.perf_counter()
+        gap = now - self._last_arrival
+        self._gap = gap if self._gap == float("inf") else 0.8 * self._gap + 0.2 * gap
+        self._last_arrival = now
+
+        future: asyncio.Future[tuple[bool, float, int]] = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._queue.put_nowait((row, now, future))
+        return await future
+
+    async def _gather(self) -> list[Pending]:
+        """waits for the 1st row, then collects a batch (adaptive window)"""
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or self._gap >= self.window:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._gather()
+            started = time.perf_counter()
+            features = np.stack([row for row, _, _ in batch])
+            try:
+                is_anomaly, scores, version = await self.run(self.score_batch, features)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, queued, future), flag, score in zip(
+                batch, is_anomaly.tolist(), scores.tolist()
+            ):
+                if not future.done():  # caller may have disconnected
+                    future.set_result((flag, score, version))
+                wait = started - queued
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            self.n_batches += 1
+            self.n_rows += len(batch)
+            self.max_batch = max(self.max_batch, len(batch))
+
+    def pending(self) -> int:
+        """rows waiting to be batched"""
+        return self._queue.qsize()
+
+    def stats(self) -> dict[str, float | int]:
+        return {
+            "window_ms": self.window * 1_000,
+            "max_size": self.max_size,
+            "batches": self.n_batches,
+            "mean_batch_size": self.n_rows / self.n_batches if self.n_batches else 0,
+            "max_batch_size": self.max_batch,
+            "mean_queue_wait_ms": (
+                1_000 * self.total_wait / self.n_rows if self.n_rows else 0
+            ),
+            "max_queue_wait_ms": 1_000 * self.max_wait,
+        }
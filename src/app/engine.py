@@ -0,0 +1,383 @@
+"""
+Inference engines used by the API server (main.py) to score sensor readings.
+Every engine has the same contract:
+    score(features) -> (is_anomaly, scores)
+    features: (n, 3) array of temperature_c, humidity_pct, sound_db
+    scores: same meaning as IsolationForest.decision_function (lower is worse,
+    below 0 is an anomaly)
+
+- SklearnEngine: calls the trained IsolationForest directly (reference)
+- FlatForest: the same forest, compiled at load time into flat NumPy node
+  arrays, and walked for all trees & rows at once (no sklearn overhead)
+- StreamEngine (streaming.py): online statistics, updated with every reading
+
+the compiled arrays are cached next to the model as .npy files (load_model):
+every API worker memory-maps the same files, so they share the physical pages,
+and a worker whose cache is up to date is ready without unpickling (or importing)
+sklearn at all
+"""
+
+import json
+import os
+import shutil
+import time
+from typing import TYPE_CHECKING, Protocol
+
+import numpy as np
+
+from src.app.streaming import StreamEngine
+
+if TYPE_CHECKING:
+    from sklearn.ensemble import IsolationForest
+
+ENGINES: tuple[str, ...] = ("flat", "sklearn", "stream")
+VERIFY_TOLERANCE: float = 1e-9  # max abs. difference with decision_function
+CHUNK_ROWS: int = 512  # rows walked at once: keeps the (rows, trees) scratch in cache
+ARRAYS: tuple[str, ...] = ("feature", "threshold", "left", "leaf_depth", "roots")
+
+
+class Engine(Protocol):
+    """what main.py expects from an inference engine"""
+
+    name: str
+    version: int  # set by main.py, counts model swaps
+    stateful: bool  # scores depend on the readings scored before
+    # training-set mean & covariance saved by train.py (None in older models)
+    feature_mean: np.ndarray | None
+    feature_cov: np.ndarray | None
+
+    def score(self, features: np.ndarray) -> tuple[np.ndarray, np.ndarray]: ...
+
+
+class SklearnEngine:
+    """reference engine: scores through sklearn's IsolationForest"""
+
+    name: str = "sklearn"
+    version: int = 0
+    stateful: bool = False
+
+    def __init__(self, model: "IsolationForest"):
+        self.model = model
+        self.feature_mean, self.feature_cov = model_stats(model)
+
+    def score(self, features: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """1 decision_function call; the flag is derived as predict() does"""
+        scores: np.ndarray = self.model.decision_function(features)
+        return scores < 0, scores
+
+
+def model_stats(
+    model: "IsolationForest",
+) -> tuple[np.ndarray | None, np.ndarray | None]:
+    """the training-set mean & covariance train.py saves with the model, if any"""
+    mean = getattr(model, "feature_mean_", None)
+    cov = getattr(model, "feature_cov_", None)
+    if mean is None or cov is None:
+        return None, None
+    return np.asarray(mean, dtype=np.float64), np.asarray(cov, dtype=np.float64)
+
+
+def average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """
+    average path length of an unsuccessful BST search in a tree of n samples,
+    i.e. the path length correction used by IsolationForest (c(n) in the paper)
+    """
+    n = np.asarray(n_samples, dtype=np.float64)
+    out = np.zeros_like(n)
+    out[n == 2] = 1.0
+    big = n > 2
+    out[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (
+        n[big] - 1.0
+    ) / n[big]
+    return out
+
+
+class FlatForest:
+    """
+    IsolationForest compiled into flat node arrays (all trees concatenated):
+        feature, threshold: split of each node (x[feature] > threshold: right)
+        left: global index of the left child, the right child is left + 1
+        leaf_depth: edges from the root + path length correction c(n_samples)
+        roots: index of the root node of each tree
+    leaves point to themselves with an infinite threshold, so every row can be
+    walked a fixed max_depth steps through all trees at once, without masking
+    """
+
+    name: str = "flat"
+    version: int = 0
+    stateful: bool = False
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        leaf_depth: np.ndarray,
+        roots: np.ndarray,
+        n_features: int,
+        max_depth: int,
+        denominator: float,
+        offset: float,
+        feature_mean: np.ndarray | None = None,
+        feature_cov: np.ndarray | None = None,
+    ):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.leaf_depth = leaf_depth
+        self.roots = roots
+        self.n_features = n_features
+        self.max_depth = max_depth
+        self.denominator = denominator  # n_trees * c(max_samples)
+        self.offset = offset  # IsolationForest.offset_
+        self.feature_mean = feature_mean
+        self.feature_cov = feature_cov
+
+    @classmethod
+    def compile(cls, model: "IsolationForest") -> "FlatForest":
+        """flattens a fitted IsolationForest"""
+        # as in sklearn: trees only see a column subset if max_features < 1.0
+        subsample_features: bool = (
+            len(model.estimators_features_[0]) != model.n_features_in_
+        )
+        n_total: int = sum(tree.tree_.node_count for tree in model.estimators_)
+        feature = np.zeros(n_total, dtype=np.intp)
+        threshold = np.full(n_total, np.inf)
+        left = np.arange(n_total, dtype=np.intp)
+        leaf_depth = np.zeros(n_total)
+        roots: list[int] = []
+        max_depth: int = 0
+
+        offset: int = 0
+        for tree, tree_features in zip(model.estimators_, model.estimators_features_):
+            t = tree.tree_
+            columns = (
+                np.asarray(tree_features)
+                if subsample_features
+                else np.arange(model.n_features_in_)
+            )
+            path_length = average_path_length(t.n_node_samples)
+            # breadth-first renumbering, so that siblings are stored side by side
+            order: list[tuple[int, int]] = [(0, 0)]  # (sklearn node, depth)
+            for new, (node, depth) in enumerate(order):
+                pos: int = offset + new
+                if t.children_left[node] == -1:
+                    leaf_depth[pos] = depth + path_length[node]
+                    max_depth = max(max_depth, depth)
+                else:
+                    feature[pos] = columns[t.feature[node]]
+                    threshold[pos] = t.threshold[node]
+                    left[pos] = offset + len(order)
+                    order.append((int(t.children_left[node]), depth + 1))
+                    order.append((int(t.children_right[node]), depth + 1))
+            roots.append(offset)
+            offset += len(order)
+
+        denominator = len(model.estimators_) * float(
+            average_path_length(np.array([model.max_samples_]))[0]
+        )
+        feature_mean, feature_cov = model_stats(model)
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            left=left,
+            leaf_depth=leaf_depth,
+            roots=np.array(roots, dtype=np.intp),
+            n_features=int(model.n_features_in_),
+            max_depth=max_depth,
+            denominator=denominator,
+            offset=float(model.offset_),
+            feature_mean=feature_mean,
+            feature_cov=feature_cov,
+        )
+
+    def _score_chunk(self, X: np.ndarray) -> np.ndarray:
+        """decision_function for a chunk of rows"""
+        values = X.ravel()
+        row_start = np.arange(0, values.size, self.n_features, dtype=np.intp)[:, None]
+        node = np.tile(self.roots, (X.shape[0], 1))
+        for _ in range(self.max_depth):
+            x = values.take(row_start + self.feature.take(node))
+            node = self.left.take(node) + (x > self.threshold.take(node))
+        depths = self.leaf_depth.take(node).sum(axis=1)
+        if self.denominator == 0:  # single-sample forest: sklearn takes 2^-1
+            return np.full(X.shape[0], -0.5 - self.offset)
+        return -np.exp2(-depths / self.denominator) - self.offset
+
+    def score(self, features: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """score & flag for 1 row or a batch, in a single pass over the forest"""
+        # sklearn trees compare float32 inputs against their thresholds
+        X = np.asarray(features, dtype=np.float32).reshape(-1, self.n_features)
+        if X.shape[0] <= CHUNK_ROWS:
+            scores = self._score_chunk(X)
+        else:
+            scores = np.concatenate(
+                [
+                    self._score_chunk(X[start : start + CHUNK_ROWS])
+                    for start in range(0, X.shape[0], CHUNK_ROWS)
+                ]
+            )
+        return scores < 0, scores
+
+    def save(self, directory: str, source: dict[str, int | str]) -> None:
+        """
+        writes the node arrays (.npy) & meta.json into directory
+        source identifies the model file they were compiled from
+        the directory is written aside, then renamed into place, so concurrent
+        workers never see it half-written (a worker losing the race keeps the other's)
+        """
+        tmp = f"{directory}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name in ARRAYS:
+            np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name))
+        meta = {
+            "source": source,
+            "n_features": self.n_features,
+            "max_depth": self.max_depth,
+            "denominator": self.denominator,
+            "offset": self.offset,
+            "feature_mean": stats_list(self.feature_mean),
+            "feature_cov": stats_list(self.feature_cov),
+        }
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        old = f"{directory}.old-{os.getpid()}"
+        try:
+            os.rename(directory, old)  # stale cache, if any
+        except OSError:
+            pass
+        try:
+            os.rename(tmp, directory)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+        shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: str) -> "FlatForest":
+        """memory-maps the node arrays written by save()"""
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {
+            # np.asarray drops the np.memmap subclass, without copying
+            name: np.asarray(
+                np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            )
+            for name in ARRAYS
+        }
+        return cls(
+            **arrays,
+            n_features=meta["n_features"],
+            max_depth=meta["max_depth"],
+            denominator=meta["denominator"],
+            offset=meta["offset"],
+            feature_mean=stats_array(meta.get("feature_mean")),
+            feature_cov=stats_array(meta.get("feature_cov")),
+        )
+
+
+def stats_list(values: np.ndarray | None) -> list | None:
+    """training-set stats <-> meta.json"""
+    return None if values is None else values.tolist()
+
+
+def stats_array(values: list | None) -> np.ndarray | None:
+    return None if values is None else np.asarray(values, dtype=np.float64)
+
+
+def probe_rows(engine: FlatForest, n_rows: int = 512, seed: int = 0) -> np.ndarray:
+    """random rows spread around the forest's split points, to check an engine"""
+    rng = np.random.default_rng(seed)
+    X = np.empty((n_rows, engine.n_features))
+    for f in range(engine.n_features):
+        splits = engine.threshold[
+            (engine.feature == f) & np.isfinite(engine.threshold)
+        ]
+        lo, hi = (splits.min(), splits.max()) if splits.size else (0.0, 1.0)
+        margin = 0.1 * (hi - lo) + 1.0
+        X[:, f] = rng.uniform(lo - margin, hi + margin, n_rows)
+    return X
+
+
+def verify(engine: FlatForest, model: "IsolationForest") -> float:
+    """max abs. difference between the engine's and sklearn's decision_function"""
+    X = probe_rows(engine)
+    _, scores = engine.score(X)
+    return float(np.max(np.abs(scores - model.decision_function(X))))
+
+
+def load_engine(model: "IsolationForest", kind: str = "flat") -> Engine:
+    """
+    builds the requested engine around a fitted IsolationForest
+    the flat engine is checked against sklearn first; sklearn is used if it fails
+    the stream engine only uses the training stats saved with it
+    """
+    if kind not in ENGINES:
+        raise ValueError(f"unknown inference engine {kind!r}, use one of {ENGINES}")
+    if kind == "sklearn":
+        return SklearnEngine(model)
+    if kind == "stream":
+        return StreamEngine(*model_stats(model), n_features=int(model.n_features_in_))
+
+    flat = FlatForest.compile(model)
+    error = verify(flat, model)
+    if error > VERIFY_TOLERANCE:
+        print(f"flat engine differs from sklearn ({error=:.2e}), using sklearn")
+        return SklearnEngine(model)
+    return flat
+
+
+def file_signature(path: str) -> dict[str, int | str]:
+    """identifies a version of a file (path, size & modification time)"""
+    stat = os.stat(path)
+    return {
+        "path": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def cached_source(cache_dir: str) -> dict[str, int | str] | None:
+    """the source signature of a compiled cache, None if there is no valid cache"""
+    try:
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            return json.load(f)["source"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def load_model(
+    model_file: str, kind: str, cache_dir: str
+) -> tuple[Engine, dict[str, float | str]]:
+    """
+    loads the engine for model_file, reusing the memory-mapped cache if up to date
+    (else: unpickles & compiles the model, and refreshes the cache for the next ones)
+    output: (engine, startup report: where it was loaded from, and timings in ms)
+    """
+    start = time.perf_counter()
+    source = file_signature(model_file)  # FileNotFoundError if no model
+    if kind == "flat" and cached_source(cache_dir) == source:
+        engine: Engine = FlatForest.load(cache_dir)
+        ms = 1_000 * (time.perf_counter() - start)
+        return engine, {"artifact": "mmap cache", "load_ms": ms, "total_ms": ms}
+
+    import joblib  # only needed (with sklearn) when there is no cache
+
+    model = joblib.load(model_file)
+    loaded = time.perf_counter()
+    engine = load_engine(model, kind)
+    report: dict[str, float | str] = {
+        "artifact": "joblib",
+        "load_ms": 1_000 * (loaded - start),
+        "compile_ms": 1_000 * (time.perf_counter() - loaded),
+    }
+    if isinstance(engine, FlatForest):
+        try:
+            engine.save(cache_dir, source)
+            if cached_source(cache_dir) == source:  # else: keep the in-memory one
+                engine = FlatForest.load(cache_dir)  # share the pages from now on
+        except OSError as e:
+            print(f"could not write the model cache {cache_dir}: {e}")
+    report["total_ms"] = 1_000 * (time.perf_counter() - start)
+    return engine, report
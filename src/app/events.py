@@ -0,0 +1,110 @@
+"""
+Push channel for the API server (main.py): every scored event is sent to the
+subscribers of GET /events (Server-Sent Events) as soon as it is recorded
+- events are serialized once per batch, in the scoring thread (off the event loop)
+- each subscriber has a bounded queue: a slow one loses events (and is told how
+  many), it never slows down scoring or the other subscribers
+"""
+
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+
+SUBSCRIBER_QUEUE: int = 1_000  # batches of events buffered per subscriber
+
+
+class Subscriber:
+    """1 GET /events connection: its queue of SSE chunks, and what it wants"""
+
+    def __init__(self, anomalies_only: bool):
+        self.anomalies_only = anomalies_only
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self.dropped: int = 0  # events lost since the last ones sent
+
+
+class EventHub:
+    """fans scored events out to the subscribers (1 hub per server process)"""
+
+    def __init__(self):
+        self.subscribers: set[Subscriber] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.n_dropped: int = 0  # for /status
+
+    def subscribe(self, anomalies_only: bool = False) -> Subscriber:
+        """called on the event loop, by the GET /events handler"""
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(anomalies_only)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    def publish(
+        self,
+        first_seq: int,
+        timestamp_ns: int,
+        features: np.ndarray,
+        is_anomaly: np.ndarray,
+        scores: np.ndarray,
+    ) -> None:
+        """
+        queues a batch of scored readings (seq. numbers first_seq, first_seq + 1, ...)
+        for every subscriber; called from any thread, a no-op without subscribers
+        """
+        if not self.subscribers or self._loop is None:
+            return
+        timestamp = datetime.fromtimestamp(
+            timestamp_ns // 1_000 / 1e6, timezone.utc
+        ).strftime("%Y-%m-%dT%H:%M:%S.%f")
+        events: list[tuple[bool, str]] = [
+            (
+                flag,
+                f"id: {first_seq + i}\ndata: "
+                + json.dumps(
+                    {
+                        "seq": first_seq + i,
+                        "timestamp": timestamp,
+                        "temperature_c": temperature,
+                        "humidity_pct": humidity,
+                        "sound_db": sound,
+                        "is_anomaly": flag,
+                        "anomaly_score": score,
+                    }
+                )
+                + "\n\n",
+            )
+            for i, ((temperature, humidity, sound), flag, score) in enumerate(
+                zip(features.tolist(), is_anomaly.tolist(), scores.tolist())
+            )
+        ]
+        all_events = "".join(text for _, text in events)
+        anomalies = "".join(text for flag, text in events if flag)
+        n_anomalies = int(np.count_nonzero(is_anomaly))
+        try:
+            self._loop.call_soon_threadsafe(
+                self._deliver, all_events, len(events), anomalies, n_anomalies
+            )
+        except RuntimeError:  # the event loop is closed: the server is stopping
+            pass
+
+    def _deliver(self, all_events: str, n_all: int, anomalies: str, n_anomalies: int):
+        """on the event loop: puts the batch into every subscriber's queue"""
+        for subscriber in self.subscribers:
+            chunk, n = (
+                (anomalies, n_anomalies)
+                if subscriber.anomalies_only
+                else (all_events, n_all)
+            )
+            if not n:
+                continue
+            try:
+                subscriber.queue.put_nowait(chunk)
+            except asyncio.QueueFull:  # slow consumer: it misses this batch
+                subscriber.dropped += n
+                self.n_dropped += n
+
+    def stats(self) -> dict[str, int]:
+        return {"subscribers": len(self.subscribers), "dropped": self.n_dropped}
@@ -0,0 +1,140 @@
+"""
+Inference executor for the API server (main.py): scoring requests run on worker
+threads of their own (not FastAPI's shared threadpool), fed by a bounded queue
+- admission never waits: when the queue is full, a request is refused at once
+  (main.py answers 503 with Retry-After), so the latency of the admitted ones stays
+  bounded under overload instead of growing with the backlog
+- a call whose caller has gone (e.g. client disconnected) while queued is skipped
+- interactive requests (e.g. the dashboard's manual checks) are taken before bulk
+  sensor traffic, and have INTERACTIVE_RESERVE more places in the queue
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import Any, TypeVar
+
+INTERACTIVE: int = 0  # queue priorities, lowest first
+BULK: int = 1
+PRIORITIES: dict[str, int] = {"interactive": INTERACTIVE, "bulk": BULK}
+INTERACTIVE_RESERVE: int = 16  # places in the queue only interactive requests get
+
+T = TypeVar("T")
+# a queued call: (priority, arrival order, caller's context, fn, args, future)
+Entry = tuple[
+    int, int, contextvars.Context, Callable[..., Any], tuple[Any, ...], Future[Any]
+]
+
+
+class Overloaded(Exception):
+    """the queue is full: retry after retry_after seconds"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"overloaded, retry after {retry_after:.1f} s")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """worker threads taking calls from a bounded priority queue"""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue  # bulk requests waiting, at most
+        self._heap: list[Entry] = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._stopping: bool = False
+        # statistics, for /status
+        self.busy: int = 0
+        self.n_done: int = 0
+        self.n_rejected: dict[str, int] = {name: 0 for name in PRIORITIES}
+        self.total_service: float = 0.0  # seconds spent running calls
+
+    def start(self) -> None:
+        self._stopping = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"inference-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """lets the workers finish what is queued, then ends them"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(
+        self, fn: Callable[..., T], *args: Any, priority: int = BULK
+    ) -> asyncio.Future[T]:
+        """
+        queues fn(*args) (run in the caller's context), returns an awaitable result
+        raises Overloaded if the queue is full for this priority
+        """
+        limit = self.max_queue + (INTERACTIVE_RESERVE if priority == INTERACTIVE else 0)
+        future: Future[T] = Future()
+        with self._cond:
+            if len(self._heap) >= limit:
+                name = "interactive" if priority == INTERACTIVE else "bulk"
+                self.n_rejected[name] += 1
+                raise Overloaded(self.retry_after())
+            context = contextvars.copy_context()
+            entry = (priority, next(self._order), context, fn, args, future)
+            heapq.heappush(self._heap, entry)
+            self._cond.notify()
+        return asyncio.wrap_future(future)
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap and not self._stopping:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                _, _, context, fn, args, future = heapq.heappop(self._heap)
+                self.busy += 1
+            start = time.perf_counter()
+            try:
+                if future.set_running_or_notify_cancel():  # else: caller gone
+                    try:
+                        future.set_result(context.run(fn, *args))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self.busy -= 1
+                    self.n_done += 1
+                    self.total_service += time.perf_counter() - start
+
+    def depth(self) -> int:
+        """requests waiting for a worker"""
+        return len(self._heap)
+
+    def retry_after(self) -> float:
+        """seconds until the queue has drained, at the average service time"""
+        mean = self.total_service / self.n_done if self.n_done else 0.01
+        return (len(self._heap) + self.busy) * mean / self.workers
+
+    def stats(self) -> dict[str, float | int]:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": self.depth(),
+            "busy": self.busy,
+            "done": self.n_done,
+            "rejected_bulk": self.n_rejected["bulk"],
+            "rejected_interactive": self.n_rejected["interactive"],
+            "mean_service_ms": (
+                1_000 * self.total_service / self.n_done if self.n_done else 0
+            ),
+        }
@@ -0,0 +1,130 @@
+"""
+In-memory history of scored events for the API server (main.py)
+a fixed-capacity ring buffer, backed by 1 preallocated NumPy array per column:
+inserting is O(1) per event and never allocates, so millions of events can be kept
+every event gets a sequence number (1, 2, ... per server process), so clients can
+fetch only the events after the last one they have seen
+"""
+
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+COLUMNS: dict[str, type] = {
+    "timestamp": np.int64,  # UTC, ns since epoch
+    "temperature_c": np.float64,
+    "humidity_pct": np.float64,
+    "sound_db": np.float64,
+    "is_anomaly": np.bool_,
+    "anomaly_score": np.float64,
+}
+RING_COLUMNS: dict[str, type] = {"seq": np.int64, **COLUMNS}
+SMALL_JSON: int = 32  # up to this many events, serialized without pandas
+
+
+class ScoreRing:
+    """ring buffer of the most recent scored events, stored column by column"""
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+        self.capacity = capacity
+        self.columns: dict[str, np.ndarray] = {
+            name: np.zeros(capacity, dtype=dtype)
+            for name, dtype in RING_COLUMNS.items()
+        }
+        self._next: int = 0  # position of the next insert
+        self._size: int = 0
+        self.last_seq: int = 0  # sequence number of the newest event
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(
+        self,
+        timestamp_ns: int,
+        features: np.ndarray,
+        is_anomaly: np.ndarray,
+        scores: np.ndarray,
+    ) -> int:
+        """
+        inserts a batch of scored readings (all with the same timestamp)
+        output: the sequence number given to the 1st reading (the next ones follow)
+        """
+        n: int = len(scores)
+        skipped: int = 0
+        if n > self.capacity:  # only the newest ones would survive anyway
+            features, is_anomaly, scores = (
+                features[-self.capacity :],
+                is_anomaly[-self.capacity :],
+                scores[-self.capacity :],
+            )
+            skipped, n = n - self.capacity, self.capacity
+        with self._lock:
+            end: int = self._next + n
+            pos = (
+                slice(self._next, end)
+                if end <= self.capacity
+                else np.arange(self._next, end) % self.capacity
+            )
+            cols = self.columns
+            first: int = self.last_seq + skipped + 1
+            cols["seq"][pos] = np.arange(first, first + n)
+            cols["timestamp"][pos] = timestamp_ns
+            cols["temperature_c"][pos] = features[:, 0]
+            cols["humidity_pct"][pos] = features[:, 1]
+            cols["sound_db"][pos] = features[:, 2]
+            cols["is_anomaly"][pos] = is_anomaly
+            cols["anomaly_score"][pos] = scores
+            self._next = (self._next + n) % self.capacity
+            self._size = min(self._size + n, self.capacity)
+            self.last_seq = first + n - 1
+        return first - skipped
+
+    def latest(self, limit: int, after: int = 0) -> dict[str, np.ndarray]:
+        """
+        copies of the newest `limit` events per column, oldest first
+        after: only events with a greater sequence number (the newest are contiguous)
+        """
+        with self._lock:
+            n: int = min(limit, self._size, max(self.last_seq - after, 0))
+            start: int = (self._next - n) % self.capacity
+            if start + n <= self.capacity:
+                return {k: v[start : start + n].copy() for k, v in self.columns.items()}
+            return {
+                k: np.concatenate((v[start:], v[: self._next]))
+                for k, v in self.columns.items()
+            }
+
+    def to_json(self, limit: int, after: int = 0) -> str:
+        """newest `limit` events with seq > after, as JSON records, oldest first"""
+        return records_json(self.latest(limit, after))
+
+
+def records_json(columns: dict[str, np.ndarray]) -> str:
+    """
+    events (1 array per column of COLUMNS, or RING_COLUMNS) as a JSON list of records
+    a few events: 1 json.dumps call (pandas' setup would cost more than the events)
+    more: serialized column-wise by pandas, without building 1 object per event
+    both write floats with 10 decimals at most, and timestamps in ISO format (µs)
+    """
+    timestamps = columns["timestamp"].view("datetime64[ns]")
+    floats = [v for v in columns.values() if v.dtype.kind == "f"]
+    if len(timestamps) <= SMALL_JSON and all(np.isfinite(v).all() for v in floats):
+        values = [
+            (
+                np.datetime_as_string(timestamps, unit="us")
+                if name == "timestamp"
+                else np.round(v, 10) if v.dtype.kind == "f" else v
+            ).tolist()
+            for name, v in columns.items()
+        ]
+        names = list(columns)
+        return json.dumps(
+            [dict(zip(names, row)) for row in zip(*values)], separators=(",", ":")
+        )
+    df = pd.DataFrame(columns | {"timestamp": timestamps}, copy=False)
+    return df.to_json(orient="records", date_format="iso", date_unit="us")
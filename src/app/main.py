@@ -1,22 +1,71 @@
 """
 This is the main API server (using FastAPI).
-It has 3 endpoints:
+It has these endpoints:
     GET /status : for checking status of server
     GET /recent_scores: to get the most recent scores
     POST /score:
-        input: sensor valuues
+        input: sensor valuues (optionally with a sensor_id: scored by its own model)
         output: anomaly prediction
+    POST /score_batch:
+        input: list of sensor values
+        output: list of anomaly predictions (same order), scored in 1 model call
+    POST /score_bin: as /score_batch, in a packed binary format instead of JSON
+    WebSocket /ws/score:
+        long-lived stream: sensor values in, anomaly predictions out
+    GET /metrics: Prometheus metrics (counts, stage latencies, buffers)
+    GET /events: Server-Sent Events, each scored event (or only anomalies) pushed live
+    GET /scores: durable history, time-range query
+    GET /scores/aggregate: per time bucket min/max/mean score & anomaly count
+    GET /scores/downsample: score series reduced to n points (LTTB), for charts
+    POST /admin/reload: swaps in the model.joblib on disk, without a restart
+    POST /admin/retrain: retrains in the background, then swaps the new model in
 """
 
-import datetime
-
-# import time
+import asyncio
+import json
+import math
+import os
+import shutil
+import time
 from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from os import getenv
 
-import joblib
 import numpy as np
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+
+from src.app.aggregate import bucket_stats, lttb
+from src.app.batching import MicroBatcher
+from src.app.engine import Engine, load_model
+from src.app.events import EventHub
+from src.app.executor import BULK, PRIORITIES, InferenceExecutor, Overloaded
+from src.app.history import ScoreRing, records_json
+from src.app.metrics import (
+    ANOMALIES,
+    METRICS,
+    READINGS,
+    Gauge,
+    MetricsMiddleware,
+    mark,
+    observe_stage,
+)
+from src.app.prefilter import MIN_AGREEMENT, Prefilter, calibrate
+from src.app.registry import ModelRegistry
+from src.app.retrain import build_candidate, fit_in_process, validate_engine
+from src.app.score_cache import ScoreCache
+from src.app.store import ScoreStore
+from src.app.streaming import StreamEngine
 
 
 class SensorData(BaseModel):
@@ -25,6 +74,8 @@ class SensorData(BaseModel):
     temperature_c: float
     humidity_pct: float
     sound_db: float
+    # device: scored with MODEL_DIR/<sensor_id>.joblib if there is one
+    sensor_id: str | None = Field(default=None, pattern=r"^[\w-][\w.-]{0,63}$")
 
 
 class PredictionOut(BaseModel):
@@ -33,98 +84,891 @@ class PredictionOut(BaseModel):
     is_anomaly: bool
     anomaly_score: float
     status: str
+    model_version: int
+    model: str  # "global", or the sensor_id whose own model scored it
 
 
 # TODO: RecentScore as a Pydantic class
 
-ml_model = None
-RECENT_SCORES: list[dict] = []
-MAX_RECENT: int = 150
+# 1 streamed message: a single reading, or a list of readings
+StreamMessage = TypeAdapter(SensorData | list[SensorData])
+# GET /status: top-level values, and sections of them
+Status = dict[str, bool | int | str | dict[str, float | int | str | list[float]]]
+
+ml_model: Engine | None = None
+MAX_RECENT: int = int(getenv("MAX_RECENT", default="150"))  # can be millions
+RECENT_SCORES: ScoreRing = ScoreRing(MAX_RECENT)
 MODEL_FILE: str = "./src/training/model.joblib"
+# compiled (flat) model, memory-mapped & shared by all workers, rebuilt if stale
+MODEL_CACHE_DIR: str = getenv("MODEL_CACHE_DIR", default="./src/training/model.flat")
+STARTUP: dict[str, float | str] = {}  # how the model was loaded, for /status
+# per-device models (<sensor_id>.joblib), loaded on first use, LRU-bounded
+MODEL_DIR: str = getenv("MODEL_DIR", default="./src/training/models")
+MODEL_CACHE_SIZE: int = int(getenv("MODEL_CACHE_SIZE", default="256"))
+MAX_BATCH: int = 10_000  # max readings per POST /score_batch (& /score_bin)
+# POST /score_bin: rows of temperature_c, humidity_pct, sound_db in (12 bytes),
+# rows of anomaly_score, is_anomaly out (5 bytes), little-endian, no padding
+BINARY_READING = np.dtype("<f4")
+BINARY_PREDICTION = np.dtype([("anomaly_score", "<f4"), ("is_anomaly", "u1")])
+# "flat": compiled NumPy forest (fast), "sklearn": IsolationForest itself,
+# "stream": online statistics that adapt with every reading (streaming.py)
+INFERENCE_ENGINE: str = getenv("INFERENCE_ENGINE", default="flat")
+# micro-batching of concurrent POST /score requests, off when the window is 0
+BATCH_WINDOW_MS: float = float(getenv("BATCH_WINDOW_MS", default="0"))
+BATCH_MAX_SIZE: int = int(getenv("BATCH_MAX_SIZE", default="64"))
+batcher: MicroBatcher | None = None
+# scoring runs on worker threads of its own, fed by a bounded priority queue: when
+# INFERENCE_QUEUE bulk requests are waiting, more are refused (503 + Retry-After)
+INFERENCE_WORKERS: int = int(
+    getenv("INFERENCE_WORKERS", default=str(os.cpu_count() or 1))
+)
+INFERENCE_QUEUE: int = int(getenv("INFERENCE_QUEUE", default="256"))
+executor: InferenceExecutor = InferenceExecutor(INFERENCE_WORKERS, INFERENCE_QUEUE)
+# "interactive" (e.g. the dashboard's manual checks) goes ahead of "bulk" (default)
+PRIORITY_HEADER: str = "X-Priority"
+# statistical prefilter ahead of the global model (prefilter.py), off by default
+# bands: Mahalanobis distances, "" to calibrate them against the forest
+PREFILTER: bool = getenv("PREFILTER", default="0") == "1"
+PREFILTER_NORMAL_BELOW: str = getenv("PREFILTER_NORMAL_BELOW", default="")
+PREFILTER_ANOMALY_ABOVE: str = getenv("PREFILTER_ANOMALY_ABOVE", default="")
+PREFILTER_MIN_AGREEMENT: float = float(
+    getenv("PREFILTER_MIN_AGREEMENT", default=str(MIN_AGREEMENT))
+)
+registry: ModelRegistry = ModelRegistry(MODEL_DIR, INFERENCE_ENGINE, MODEL_CACHE_SIZE)
+# scores of recent readings, by values quantized to the resolution (0 entries: off)
+SCORE_CACHE_SIZE: int = int(getenv("SCORE_CACHE_SIZE", default="0"))
+SCORE_CACHE_RESOLUTION: float = float(getenv("SCORE_CACHE_RESOLUTION", default="0.001"))
+SCORE_CACHE_TTL_S: float = float(getenv("SCORE_CACHE_TTL_S", default="300"))
+score_cache: ScoreCache | None = (
+    ScoreCache(SCORE_CACHE_RESOLUTION, SCORE_CACHE_SIZE, SCORE_CACHE_TTL_S)
+    if SCORE_CACHE_SIZE > 0
+    else None
+)
+STREAM_QUEUE: int = 1_000  # max. received but unscored messages, per stream
+# durable score log (SQLite), shared by all workers, "" to disable
+SCORE_DB: str = getenv("SCORE_DB", default="./data/scores.db")
+score_store: ScoreStore | None = None
+EVENTS: EventHub = EventHub()  # subscribers of GET /events
+KEEPALIVE_S: float = 15.0  # comment sent on an idle /events stream, keeps proxies open
+MAX_QUERY: int = 100_000  # max. events per GET /scores
+MAX_BUCKETS: int = 10_000  # max. buckets per GET /scores/aggregate
+MAX_POINTS: int = 5_000  # max. points per GET /scores/downsample
+# above this many events in the range, downsampling starts from the per-second rollup
+MAX_DOWNSAMPLE_EVENTS: int = 200_000
+# hot-swap: every model swapped in gets the next version (the 1st one loaded is 1)
+MODEL_VERSION: int = 0
+MODEL_INFO: dict[str, float | int | str] = {}  # the model in use, for /status
+RETRAIN_INPUT: str = getenv(
+    "RETRAIN_INPUT", default="./src/training/sensor-training-data.csv"
+)
+RETRAIN_JOBS: int = int(getenv("RETRAIN_JOBS", default="1"))  # cores for training
+RETRAIN_INTERVAL_S: float = float(getenv("RETRAIN_INTERVAL_S", default="0"))  # 0: off
+RETRAIN: dict[str, float | str] = {}  # last retraining, for /status
+swap_lock: asyncio.Lock = asyncio.Lock()  # 1 reload / retraining at a time
+background: set[asyncio.Task] = set()  # retraining tasks (keeps references)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Ensures that ML model is loaded while API server is active"""
-    global ml_model
+    global batcher, score_store
     try:
-        ml_model = joblib.load(MODEL_FILE)
-        print("ML model loaded")
+        engine, report = load_model(MODEL_FILE, INFERENCE_ENGINE, MODEL_CACHE_DIR)
+        engine = with_prefilter(engine, report)
+        STARTUP.update(report)
+        install_model(engine, report)
+        print(f"ML model loaded ({engine.name} engine, {report['artifact']})")
     except FileNotFoundError:
         print("model.joblib not found. Perhaps run training first")
+    executor.start()
+    if SCORE_DB:
+        score_store = ScoreStore(SCORE_DB)
+        score_store.start()
+        print(f"scores are kept in {SCORE_DB}")
+    if BATCH_WINDOW_MS > 0:
+        batcher = MicroBatcher(
+            score_and_record, BATCH_WINDOW_MS, BATCH_MAX_SIZE, run=executor.submit
+        )
+        batcher.start()
+        print(f"micro-batching on: {BATCH_WINDOW_MS} ms, max {BATCH_MAX_SIZE}")
+    if RETRAIN_INTERVAL_S > 0:
+        start_background(retrain_periodically())
+        print(f"retraining every {RETRAIN_INTERVAL_S} s")
     yield
+    for task in list(background):
+        task.cancel()
+    if batcher:
+        await batcher.stop()
+        batcher = None
+    await asyncio.to_thread(executor.stop)  # finishes what is queued
+    if score_store:
+        await asyncio.to_thread(score_store.stop)  # writes what is still queued
+        score_store = None
 
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+# buffers & model, read when /metrics is scraped
+for gauge in (
+    Gauge(
+        "model_load_seconds",
+        "how long loading the model in use took",
+        lambda: float(MODEL_INFO.get("total_ms", 0)) / 1_000,
+    ),
+    Gauge("model_version", "version of the global model", lambda: MODEL_VERSION),
+    Gauge("recent_scores_events", "events kept", lambda: len(RECENT_SCORES)),
+    Gauge("recent_scores_capacity", "capacity of /recent_scores", lambda: MAX_RECENT),
+    Gauge(
+        "batch_queue_rows",
+        "rows waiting for micro-batching",
+        lambda: batcher.pending() if batcher else 0,
+    ),
+    Gauge(
+        "inference_queue_depth",
+        "scoring calls waiting for an inference worker",
+        executor.depth,
+    ),
+    Gauge("inference_workers_busy", "inference workers scoring", lambda: executor.busy),
+    Gauge(
+        "score_store_pending_batches",
+        "batches waiting to be written to the score log",
+        lambda: float(score_store.stats()["pending_batches"]) if score_store else 0,
+    ),
+    Gauge(
+        "prefilter_hit_ratio",
+        "share of readings decided without the forest",
+        lambda: (
+            float(ml_model.stats()["hit_ratio"])
+            if isinstance(ml_model, Prefilter)
+            else 0
+        ),
+    ),
+    Gauge(
+        "score_cache_hit_ratio",
+        "share of readings whose score came from the score cache",
+        lambda: score_cache.hit_ratio() if score_cache else 0,
+    ),
+    Gauge("events_subscribers", "GET /events streams", lambda: len(EVENTS.subscribers)),
+    Gauge("device_models_loaded", "device models in memory", lambda: registry.loaded()),
+):
+    METRICS.add(gauge)
 
 
 @app.get("/status")
-def get_status() -> dict[str, bool | str]:
+def get_status() -> Status:
     """GET endpoint /status: returns the current status of the API"""
-    return {
+    status: Status = {
         "service": "Anomaly Detection",
         "model_loaded": ml_model is not None,
+        "engine": ml_model.name if ml_model else "none",
+        "model_version": ml_model.version if ml_model else 0,
     }
+    if STARTUP:
+        status["startup"] = STARTUP
+    if MODEL_INFO:
+        status["model"] = MODEL_INFO
+    if RETRAIN:
+        status["retrain"] = RETRAIN
+    if isinstance(ml_model, Prefilter):
+        status["prefilter"] = ml_model.stats()
+    if isinstance(ml_model, StreamEngine):
+        status["stream"] = ml_model.stats()
+    if score_cache:
+        status["score_cache"] = score_cache.stats()
+    status["executor"] = executor.stats()
+    if batcher:
+        status["batching"] = batcher.stats()
+    if score_store:
+        status["store"] = score_store.stats()
+    status["events"] = EVENTS.stats()
+    status["devices"] = registry.stats()
+    return status
+
 
+@app.get("/metrics")
+def get_metrics() -> Response:
+    """GET endpoint /metrics: all metrics, in Prometheus' text format"""
+    return Response(METRICS.render(), media_type="text/plain; version=0.0.4")
 
-@app.post("/score", response_model=PredictionOut)
-def predict_anomaly(data: SensorData) -> PredictionOut:
+
+def to_features(readings: list[SensorData]) -> np.ndarray:
+    """stacks sensor readings into the (n, 3) feature matrix the model expects"""
+    return np.array(
+        [[r.temperature_c, r.humidity_pct, r.sound_db] for r in readings],
+        dtype=np.float64,
+    ).reshape(-1, 3)
+
+
+def score_features(
+    features: np.ndarray, engine: Engine | None = None
+) -> tuple[np.ndarray, np.ndarray, int]:
     """
-    POST endpoint /score:
-    input: sensor values (SensorData class)
-    output: anomaly prediction (PredictionOut class)
+    scores a feature matrix with 1 call to the inference engine (default: global)
+    output: (is_anomaly, scores, model version), lower score is worse
     """
-    # start_time = time.perf_counter()
-    if not ml_model:
+    engine = engine or ml_model  # a model swapped in meanwhile: only for later calls
+    if engine is None:
         raise HTTPException(status_code=503, detail="Model not availalbe")
+    start = time.perf_counter()
+    if score_cache and not engine.stateful:
+        is_anomaly, scores = score_cache.score(engine, features)
+    else:
+        is_anomaly, scores = engine.score(features)
+    observe_stage("inference", time.perf_counter() - start)
+    return is_anomaly, scores, engine.version
 
-    features: np.ndarray = np.array(
-        [[data.temperature_c, data.humidity_pct, data.sound_db]]
-    )
-    prediction: int = ml_model.predict(features)[0]  # -1: abnormal, 1: normal
-    score: float = ml_model.decision_function(features)[0]  # lower is worse
 
-    if prediction == -1:
-        is_anomaly = True
-    else:
-        is_anomaly = False
+def record_scores(
+    features: np.ndarray, is_anomaly: np.ndarray, scores: np.ndarray
+) -> None:
+    """
+    appends scored readings to RECENT_SCORES in one go (oldest are overwritten),
+    queues them for the durable score log (written in the background)
+    and pushes them to the GET /events subscribers
+    """
+    start = time.perf_counter()
+    now: int = time.time_ns()
+    first_seq: int = RECENT_SCORES.append(now, features, is_anomaly, scores)
+    if score_store:
+        score_store.append(now, features, is_anomaly, scores)
+    EVENTS.publish(first_seq, now, features, is_anomaly, scores)
+    READINGS.inc(len(scores))
+    ANOMALIES.inc(int(np.count_nonzero(is_anomaly)))
+    observe_stage("bookkeeping", time.perf_counter() - start)
+
 
-    result = PredictionOut(
-        is_anomaly=is_anomaly,
-        anomaly_score=score,
-        status="anomaly" if is_anomaly else "normal",
+def score_and_record(
+    features: np.ndarray, engine: Engine | None = None
+) -> tuple[np.ndarray, np.ndarray, int]:
+    """scores a feature matrix and keeps the results in RECENT_SCORES"""
+    is_anomaly, scores, version = score_features(features, engine)
+    record_scores(features, is_anomaly, scores)
+    return is_anomaly, scores, version
+
+
+def score_readings(
+    readings: list[SensorData],
+) -> tuple[np.ndarray, np.ndarray, list[int], list[str]]:
+    """
+    scores & records readings with the model of their device (1 call per model);
+    devices without a model of their own are scored by the global model
+    output: (is_anomaly, scores, model version & model name of each reading)
+    raises LookupError if a reading has no model at all
+    """
+    features: np.ndarray = to_features(readings)
+    engines: dict[str, Engine | None] = {"global": ml_model}
+    rows: dict[str, list[int]] = {}
+    for i, reading in enumerate(readings):
+        model: str = "global"
+        if reading.sensor_id:
+            if reading.sensor_id not in engines:
+                engines[reading.sensor_id] = registry.get(reading.sensor_id)
+            if engines[reading.sensor_id] is not None:
+                model = reading.sensor_id
+        rows.setdefault(model, []).append(i)
+    if any(engines[model] is None for model in rows):
+        raise LookupError("Model not availalbe")
+
+    if len(rows) == 1:  # usual case: 1 call, no reordering
+        (model,) = rows
+        is_anomaly, scores, version = score_and_record(features, engines[model])
+        return is_anomaly, scores, [version] * len(readings), [model] * len(readings)
+    is_anomaly = np.zeros(len(readings), dtype=bool)
+    scores = np.zeros(len(readings))
+    versions: list[int] = [0] * len(readings)
+    models: list[str] = [""] * len(readings)
+    for model, indices in rows.items():
+        flags, values, version = score_and_record(features[indices], engines[model])
+        is_anomaly[indices], scores[indices] = flags, values
+        for i in indices:
+            versions[i], models[i] = version, model
+    return is_anomaly, scores, versions, models
+
+
+def request_priority(request: Request) -> int:
+    """the executor priority asked for in the PRIORITY_HEADER (default: bulk)"""
+    return PRIORITIES.get(request.headers.get(PRIORITY_HEADER, "").lower(), BULK)
+
+
+def overloaded(retry_after: float) -> HTTPException:
+    """503 with a Retry-After header (whole seconds, at least 1)"""
+    return HTTPException(
+        status_code=503,
+        detail="overloaded, retry later",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
     )
 
-    RECENT_SCORES.append(
+
+async def run_inference(priority: int, fn, *args):
+    """runs fn(*args) on the inference executor, 503 if its queue is full"""
+    try:
+        return await executor.submit(fn, *args, priority=priority)
+    except Overloaded as e:
+        raise overloaded(e.retry_after) from e
+
+
+def to_predictions(
+    is_anomaly: np.ndarray,
+    scores: np.ndarray,
+    versions: list[int],
+    models: list[str],
+) -> list[PredictionOut]:
+    """builds the API output for each scored reading"""
+    return [
+        PredictionOut(
+            is_anomaly=flag,
+            anomaly_score=score,
+            status="anomaly" if flag else "normal",
+            model_version=version,
+            model=model,
+        )
+        for flag, score, version, model in zip(
+            is_anomaly.tolist(), scores.tolist(), versions, models
+        )
+    ]
+
+
+@app.post(
+    "/score",
+    response_model=PredictionOut,
+    openapi_extra={  # the body is parsed by the endpoint itself
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"$ref": "#/components/schemas/SensorData"}
+                }
+            },
+        }
+    },
+)
+async def predict_anomaly(request: Request) -> Response:
+    """
+    POST endpoint /score:
+    input: sensor values (SensorData class)
+    output: anomaly prediction (PredictionOut class)
+    scored by the inference executor, or together with concurrent requests
+    (micro-batching, bulk requests only)
+    the body is validated straight from its JSON bytes, and the prediction written
+    as JSON directly: no intermediate dict & response model validation per request
+    """
+    try:
+        data = SensorData.model_validate_json(await request.body())
+    except ValidationError as e:
+        errors = e.errors(include_url=False)
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in errors]
+        )
+    mark("handler")
+    engine: Engine | None = ml_model
+    model: str = "global"
+    if data.sensor_id:
+        known, device = registry.cached(data.sensor_id)
+        if not known:  # 1st request of this device: look for its model on disk
+            device = await run_in_threadpool(registry.get, data.sensor_id)
+        if device:
+            engine, model = device, data.sensor_id
+    if not engine:
+        raise HTTPException(status_code=503, detail="Model not availalbe")
+
+    features: np.ndarray = to_features([data])
+    priority: int = request_priority(request)
+    if batcher and model == "global" and priority == BULK:
+        if batcher.pending() >= INFERENCE_QUEUE:
+            raise overloaded(executor.retry_after())
+        try:
+            flag, score, version = await batcher.submit(features[0])
+        except Overloaded as e:  # the batch was refused by the executor
+            raise overloaded(e.retry_after) from e
+    else:
+        is_anomaly, scores, version = await run_inference(
+            priority, score_and_record, features, engine
+        )
+        flag, score = bool(is_anomaly[0]), float(scores[0])
+    mark("handled")  # encoding the JSON below is the "serialization" stage
+    body: str = json.dumps(
         {
-            "timestamp": datetime.datetime.utcnow().isoformat(),
-            "temperature_c": data.temperature_c,
-            "humidity_pct": data.humidity_pct,
-            "sound_db": data.sound_db,
-            "is_anomaly": is_anomaly,
+            "is_anomaly": flag,
             "anomaly_score": score,
+            "status": "anomaly" if flag else "normal",
+            "model_version": version,
+            "model": model,
         }
     )
-    if len(RECENT_SCORES) > MAX_RECENT:
-        RECENT_SCORES.pop(0)
+    return Response(body, media_type="application/json")
 
-    # return {
-    # "is_anomaly": is_anomaly,
-    # "anomaly_score": float(score),
-    # "status": "Anomaly detected" if is_anomaly else "Normal",
-    # }
-    # duration_time = time.perf_counter() - start_time
-    # print(f"inside API (POST): {duration_time=:.3f}")
-    return result
+
+@app.post("/score_batch", response_model=list[PredictionOut])
+async def predict_anomaly_batch(
+    readings: list[SensorData], request: Request
+) -> list[PredictionOut]:
+    """
+    POST endpoint /score_batch:
+    input: list of sensor values (SensorData class)
+    output: list of anomaly predictions (PredictionOut class), in input order
+    all readings are scored with a single (vectorized) call per model
+    """
+    mark("handler")
+    if len(readings) > MAX_BATCH:
+        raise HTTPException(
+            status_code=413, detail=f"batch too large, max {MAX_BATCH} readings"
+        )
+    if not readings:
+        return []
+
+    try:
+        results = await run_inference(
+            request_priority(request), score_readings, readings
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    predictions = to_predictions(*results)
+    mark("handled")
+    return predictions
+
+
+@app.post("/score_bin")
+async def predict_anomaly_binary(request: Request) -> Response:
+    """
+    POST endpoint /score_bin: /score_batch without JSON, for high-rate clients
+    input: packed rows of 3 float32 (BINARY_READING), as in SensorData
+    output: packed rows of anomaly_score & is_anomaly (BINARY_PREDICTION), in input
+    order, with the model version in header X-Model-Version
+    the body is scored in place (np.frombuffer, no copy); global model only
+    """
+    body: bytes = await request.body()
+    n_values, remainder = divmod(len(body), BINARY_READING.itemsize)
+    if remainder or n_values % 3:
+        raise HTTPException(
+            status_code=422, detail="body must be rows of 3 little-endian float32"
+        )
+    features: np.ndarray = np.frombuffer(body, dtype=BINARY_READING).reshape(-1, 3)
+    mark("handler")
+    if len(features) > MAX_BATCH:
+        raise HTTPException(
+            status_code=413, detail=f"batch too large, max {MAX_BATCH} readings"
+        )
+    engine: Engine | None = ml_model
+    if not engine:
+        raise HTTPException(status_code=503, detail="Model not availalbe")
+
+    out = np.empty(len(features), dtype=BINARY_PREDICTION)
+    version: int = engine.version
+    if len(features):
+        is_anomaly, scores, version = await run_inference(
+            request_priority(request), score_and_record, features, engine
+        )
+        out["anomaly_score"], out["is_anomaly"] = scores, is_anomaly
+    mark("handled")
+    return Response(
+        out.tobytes(),
+        media_type="application/octet-stream",
+        headers={"X-Model-Version": str(version)},
+    )
 
 
 # @app.get("/recent_scores", response_model = List[])
 @app.get("/recent_scores")
-def recent_scores(limit: int = 20):
+def recent_scores(limit: int = 20, after: int = 0) -> Response:
     """
     GET endpoint /recent_scores: keeps track of the most recent predictions
     limit: how many scores to return. Default: 20
+    after: only events with a greater "seq" (cursor: the last seq already fetched)
+    header X-Last-Seq: the newest seq; lower than `after` if the server restarted
     """
     if limit <= 0:
         limit = 1
-    return RECENT_SCORES[-limit:]
+    body: str = RECENT_SCORES.to_json(limit, after)
+    return Response(
+        body,
+        media_type="application/json",
+        headers={"X-Last-Seq": str(RECENT_SCORES.last_seq)},
+    )
+
+
+@app.get("/events")
+async def event_stream(anomalies_only: bool = False) -> StreamingResponse:
+    """
+    GET endpoint /events: Server-Sent Events, 1 per scored event as soon as it is
+    recorded (data: JSON as in /recent_scores, id: its seq)
+    anomalies_only: only push the anomalies
+    "event: dropped" (data: how many) if this client fell behind & events were skipped
+    """
+    subscriber = EVENTS.subscribe(anomalies_only)
+
+    async def stream():
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE_S)
+                except TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if subscriber.dropped:
+                    yield f"event: dropped\ndata: {subscriber.dropped}\n\n"
+                    subscriber.dropped = 0
+                yield chunk
+        finally:  # client gone (or server stopping)
+            EVENTS.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def to_ns(moment: datetime) -> int:
+    """ns since epoch; a datetime without time zone is taken as UTC"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    since = moment - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (since.days * 86_400 + since.seconds) * 10**9 + since.microseconds * 1_000
+
+
+@app.get("/scores")
+def scores_between(
+    start: datetime, end: datetime | None = None, limit: int = 1_000
+) -> Response:
+    """
+    GET endpoint /scores: scored events from the durable log, oldest first
+    start, end: ISO 8601 time range (end excluded, default: now), UTC if no zone
+    limit: max. events returned. Default: 1000
+    """
+    if not score_store:
+        raise HTTPException(status_code=503, detail="Score store not enabled")
+    end_ns: int = to_ns(end) if end else time.time_ns()
+    limit = min(max(limit, 1), MAX_QUERY)
+    events = score_store.query(to_ns(start), end_ns, limit)
+    return Response(records_json(events), media_type="application/json")
+
+
+def history_between(start_ns: int, end_ns: int) -> dict[str, np.ndarray]:
+    """events of RECENT_SCORES in [start_ns, end_ns), when there is no score store"""
+    events = RECENT_SCORES.latest(RECENT_SCORES.capacity)
+    keep = (events["timestamp"] >= start_ns) & (events["timestamp"] < end_ns)
+    return {name: column[keep] for name, column in events.items()}
+
+
+@app.get("/scores/aggregate")
+def scores_aggregate(
+    start: datetime, end: datetime | None = None, bucket_s: float = 60
+) -> Response:
+    """
+    GET endpoint /scores/aggregate: 1 record per time bucket (empty ones left out)
+    with count, min_score, max_score, mean_score & anomalies (count)
+    start, end: ISO 8601 time range (end excluded, default: now), UTC if no zone
+    bucket_s: bucket width in seconds. Default: 60
+    from the durable log if enabled (else from /recent_scores' history)
+    """
+    start_ns: int = to_ns(start)
+    end_ns: int = to_ns(end) if end else time.time_ns()
+    bucket_ns: int = round(bucket_s * 1e9)
+    if bucket_ns <= 0 or (end_ns - start_ns) / bucket_ns > MAX_BUCKETS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"bucket_s must be > 0, with at most {MAX_BUCKETS} buckets",
+        )
+    if score_store:
+        buckets = score_store.aggregate(start_ns, end_ns, bucket_ns)
+    else:
+        events = history_between(start_ns, end_ns)
+        buckets = bucket_stats(
+            events["timestamp"],
+            events["anomaly_score"],
+            events["is_anomaly"],
+            bucket_ns,
+        )
+    return Response(records_json(buckets), media_type="application/json")
+
+
+@app.get("/scores/downsample")
+def scores_downsample(
+    start: datetime, end: datetime | None = None, points: int = 500
+) -> Response:
+    """
+    GET endpoint /scores/downsample: the anomaly_score series, reduced to at most
+    `points` records (timestamp, anomaly_score) that keep its shape (LTTB)
+    start, end: ISO 8601 time range (end excluded, default: now), UTC if no zone
+    long ranges are reduced from the lowest (worst) score of each second
+    """
+    start_ns: int = to_ns(start)
+    end_ns: int = to_ns(end) if end else time.time_ns()
+    points = min(max(points, 3), MAX_POINTS)
+    if score_store:
+        timestamps, scores = score_store.series(start_ns, end_ns, MAX_DOWNSAMPLE_EVENTS)
+    else:
+        events = history_between(start_ns, end_ns)
+        timestamps, scores = events["timestamp"], events["anomaly_score"]
+    keep = lttb(timestamps, scores, points)
+    series = {"timestamp": timestamps[keep], "anomaly_score": scores[keep]}
+    return Response(records_json(series), media_type="application/json")
+
+
+def score_messages(messages: list[str]) -> list[str]:
+    """
+    scores streamed messages together (1 call per model), for /ws/score
+    output: 1 JSON reply per message, in the shape of the message (object or list)
+    """
+    parsed: list[list[SensorData] | str] = []
+    singles: list[bool] = []
+    for message in messages:
+        try:
+            readings = StreamMessage.validate_json(message)
+        except ValidationError as e:
+            parsed.append(json.dumps({"detail": e.errors(include_url=False)}))
+            singles.append(True)
+            continue
+        singles.append(isinstance(readings, SensorData))
+        parsed.append([readings] if isinstance(readings, SensorData) else readings)
+
+    readings_all = [r for p in parsed if not isinstance(p, str) for r in p]
+    results: list[dict[str, bool | float | int | str]] = []
+    if readings_all:
+        try:
+            is_anomaly, scores, versions, models = score_readings(readings_all)
+        except LookupError as e:
+            error = json.dumps({"detail": str(e)})
+            return [p if isinstance(p, str) else error for p in parsed]
+        results = [
+            {
+                "is_anomaly": flag,
+                "anomaly_score": score,
+                "status": "anomaly" if flag else "normal",
+                "model_version": version,
+                "model": model,
+            }
+            for flag, score, version, model in zip(
+                is_anomaly.tolist(), scores.tolist(), versions, models
+            )
+        ]
+
+    replies: list[str] = []
+    start: int = 0
+    for p, single in zip(parsed, singles):
+        if isinstance(p, str):
+            replies.append(p)
+            continue
+        chunk = results[start : start + len(p)]
+        start += len(p)
+        replies.append(json.dumps(chunk[0] if single else chunk))
+    return replies
+
+
+async def stream_replies(messages: list[str]) -> list[str]:
+    """
+    score_messages on the inference executor (bulk); while its queue is full, waits
+    instead of refusing: the stream's inbox fills up, and TCP slows the sender down
+    """
+    while True:
+        try:
+            return await executor.submit(score_messages, messages)
+        except Overloaded as e:
+            await asyncio.sleep(e.retry_after)
+
+
+@app.websocket("/ws/score")
+async def score_stream(websocket: WebSocket) -> None:
+    """
+    WebSocket endpoint /ws/score: persistent streaming ingest
+    input: text messages, each 1 reading (JSON object) or many (JSON array)
+    output: 1 text message per input message, in order, with the prediction(s)
+    messages that arrive while earlier ones are scored are scored together
+    a binary message closes the stream (code 1003), once the earlier ones are answered
+    """
+    await websocket.accept()
+    inbox: asyncio.Queue[str | None] = asyncio.Queue(maxsize=STREAM_QUEUE)
+    binary: bool = False
+
+    async def receive() -> None:
+        nonlocal binary
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                text = message.get("text")
+                if text is None:
+                    binary = True
+                    break
+                await inbox.put(text)
+        except Exception as e:  # whatever ends the stream, the loop below must know
+            print(f"stream receive failed: {e!r}")
+        finally:
+            task = asyncio.current_task()
+            if task is None or not task.cancelling():  # else: the stream has ended
+                await inbox.put(None)
+
+    receiver = asyncio.create_task(receive())
+    try:
+        closed: bool = False
+        while not closed:
+            messages: list[str | None] = [await inbox.get()]
+            while not inbox.empty():
+                messages.append(inbox.get_nowait())
+            if None in messages:
+                closed = True
+                messages = messages[: messages.index(None)]
+            if not messages:
+                break
+            replies = await stream_replies(messages)
+            for reply in replies:
+                await websocket.send_text(reply)
+        if binary:
+            await websocket.close(code=1003, reason="text (JSON) messages only")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+
+
+def with_prefilter(engine: Engine, report: dict[str, float | str]) -> Engine:
+    """
+    engine behind the prefilter if it is on (PREFILTER=1), its bands calibrated or
+    checked against the engine; the engine alone if the model cannot be prefiltered
+    """
+    if not PREFILTER:
+        return engine
+    start = time.perf_counter()
+    try:
+        prefilter = calibrate(
+            engine,
+            float(PREFILTER_NORMAL_BELOW) if PREFILTER_NORMAL_BELOW else None,
+            float(PREFILTER_ANOMALY_ABOVE) if PREFILTER_ANOMALY_ABOVE else None,
+            PREFILTER_MIN_AGREEMENT,
+        )
+    except ValueError as e:
+        print(f"prefilter off: {e}")
+        report["prefilter"] = f"off: {e}"
+        return engine
+    report["prefilter_ms"] = 1_000 * (time.perf_counter() - start)
+    print(
+        f"prefilter on: normal below {prefilter.normal_below}, "
+        f"anomaly above {prefilter.anomaly_above}"
+    )
+    return prefilter
+
+
+def install_model(engine: Engine, report: dict[str, float | str]) -> int:
+    """
+    swaps engine in as ml_model, with the next version number
+    1 reference assignment: requests already scoring keep the engine they hold
+    """
+    global ml_model, MODEL_VERSION
+    MODEL_VERSION += 1
+    engine.version = MODEL_VERSION
+    ml_model = engine
+    if score_cache:
+        score_cache.clear()  # device models too: reload_model reloads them
+    MODEL_INFO.clear()
+    MODEL_INFO.update(report, version=MODEL_VERSION, loaded_at=time.time())
+    return MODEL_VERSION
+
+
+async def reload_model() -> dict[str, float | int | str]:
+    """
+    loads, compiles & validates MODEL_FILE in a worker thread, then swaps it in
+    without RETRAIN_INPUT (e.g. a serve-only deployment) it is not validated
+    """
+    engine, report = await run_in_threadpool(
+        load_model, MODEL_FILE, INFERENCE_ENGINE, MODEL_CACHE_DIR
+    )
+    if os.path.exists(RETRAIN_INPUT):
+        report |= await run_in_threadpool(validate_engine, engine, RETRAIN_INPUT)
+    else:
+        report["validation"] = f"skipped: no {RETRAIN_INPUT}"
+    engine = await run_in_threadpool(with_prefilter, engine, report)
+    install_model(engine, report)
+    registry.clear()  # device models are reloaded from disk too, on next use
+    return dict(MODEL_INFO)
+
+
+async def retrain_model() -> None:
+    """
+    fits a candidate model in a separate process, validates it in a worker thread,
+    then replaces MODEL_FILE with it and swaps it in; the current model serves meanwhile
+    if the swap fails, the previous MODEL_FILE is put back (a restart loads the model
+    in use, not the one that failed)
+    """
+    candidate: str = f"{MODEL_FILE}.candidate"
+    previous: str = f"{MODEL_FILE}.previous"
+    replaced: bool = False
+    started = time.time()
+    try:
+        async with swap_lock:
+            await fit_in_process(RETRAIN_INPUT, candidate, RETRAIN_JOBS)
+            engine = await run_in_threadpool(build_candidate, candidate, "sklearn")
+            await run_in_threadpool(validate_engine, engine, RETRAIN_INPUT)
+            if os.path.exists(MODEL_FILE):  # copy: MODEL_FILE is never missing
+                await run_in_threadpool(shutil.copy2, MODEL_FILE, previous)
+            os.replace(candidate, MODEL_FILE)
+            replaced = True
+            info = await reload_model()  # compiles it & refreshes the mmap cache
+        RETRAIN.update(state="done", model_version=info["version"])
+    except Exception as e:  # the current model stays in use
+        RETRAIN.update(state="failed", error=f"{type(e).__name__}: {e}")
+        print(f"retraining failed: {e}")
+        if replaced and os.path.exists(previous):
+            os.replace(previous, MODEL_FILE)
+    for leftover in (candidate, previous):
+        try:
+            os.remove(leftover)
+        except OSError:
+            pass
+    RETRAIN["duration_s"] = time.time() - started
+
+
+def start_retrain() -> asyncio.Task | None:
+    """starts retrain_model in the background, None if a swap is already going on"""
+    if swap_lock.locked() or RETRAIN.get("state") == "running":
+        return None
+    RETRAIN.clear()
+    RETRAIN.update(state="running", started_at=time.time())
+    return start_background(retrain_model())
+
+
+async def retrain_periodically() -> None:
+    """retrains every RETRAIN_INTERVAL_S, for as long as the server runs"""
+    while True:
+        await asyncio.sleep(RETRAIN_INTERVAL_S)
+        task = start_retrain()
+        if task:
+            await asyncio.shield(task)  # cancelled at shutdown on its own
+
+
+def start_background(coroutine) -> asyncio.Task:
+    """runs coroutine as a task, which is cancelled at shutdown"""
+    task = asyncio.create_task(coroutine)
+    background.add(task)
+    task.add_done_callback(background.discard)
+    return task
+
+
+@app.post("/admin/reload")
+async def admin_reload() -> dict[str, float | int | str]:
+    """
+    POST endpoint /admin/reload: swaps in the model.joblib currently on disk
+    (and drops the loaded device models, reloaded from MODEL_DIR on next use)
+    output: the new model's version, load timings & validation results
+    """
+    if swap_lock.locked():
+        raise HTTPException(status_code=409, detail="a model swap is in progress")
+    async with swap_lock:
+        try:
+            return await reload_model()
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e)) from e
+        except ValueError as e:  # validation failed, the current model stays
+            raise HTTPException(status_code=422, detail=str(e)) from e
+
+
+@app.post("/admin/retrain", status_code=202)
+async def admin_retrain() -> dict[str, str]:
+    """
+    POST endpoint /admin/retrain: starts retraining in the background
+    the new model is swapped in once validated; follow it in /status ("retrain")
+    """
+    if not start_retrain():
+        raise HTTPException(status_code=409, detail="a model swap is in progress")
+    return {"detail": "retraining started"}
@@ -0,0 +1,219 @@
+"""
+Prometheus metrics for the API server (main.py), served by GET /metrics
+(text exposition format), without a client library: counters, gauges &
+fixed-bucket histograms are plain numbers behind a lock, a few microseconds
+per request in total, so they can stay on under full load
+
+each request is timed in stages, from timestamps taken along the way:
+    validation: request received -> endpoint called (body read & pydantic validation)
+    inference: the inference engine's score() call
+    bookkeeping: history, score log & /events (record_scores)
+    serialization: endpoint returned -> response started (response model & JSON)
+metrics are per server process (1 per uvicorn worker)
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable
+from contextvars import ContextVar
+
+# seconds; the stages of 1 reading take microseconds, whole batches milliseconds
+BUCKETS: tuple[float, ...] = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+# timestamps of the current request, set by MetricsMiddleware (a dict, so that
+# the threadpool's copy of the context still writes into the same one)
+REQUEST_TIMES: ContextVar[dict[str, float] | None] = ContextVar(
+    "REQUEST_TIMES", default=None
+)
+
+
+def labels_text(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class Counter:
+    """monotonic count, per combination of label values"""
+
+    def __init__(self, name: str, help: str, label_names: tuple[str, ...] = ()):
+        self.name, self.help, self.label_names = name, help, label_names
+        self.values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values: str) -> None:
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, count in sorted(self.values.items()):
+            labels = labels_text(dict(zip(self.label_names, values)))
+            lines.append(f"{self.name}{labels} {count}")
+        return lines
+
+
+class Gauge:
+    """current value, read when /metrics is scraped (callback) or set directly"""
+
+    def __init__(self, name: str, help: str, read: Callable[[], float] | None = None):
+        self.name, self.help, self.read = name, help, read
+        self.value: float = 0
+
+    def inc(self, amount: float = 1) -> None:  # only from the event loop's thread
+        self.value += amount
+
+    def render(self) -> list[str]:
+        value = self.read() if self.read else self.value
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {value}",
+        ]
+
+
+class Histogram:
+    """distribution of durations (seconds), per combination of label values"""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = BUCKETS,
+    ):
+        self.name, self.help, self.label_names = name, help, label_names
+        self.buckets = buckets
+        # label values: [count per bucket (not cumulative) + overflow, sum]
+        self.series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, *label_values: str) -> None:
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = (
+                    [0] * (len(self.buckets) + 1),
+                    [0.0],
+                )
+            series[0][i] += 1
+            series[1][0] += seconds
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: (list(c), s[0]) for k, (c, s) in self.series.items()}
+        for values, (counts, total) in sorted(snapshot.items()):
+            labels = dict(zip(self.label_names, values))
+            cumulative: int = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = labels_text(labels | {"le": str(bound)})
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{labels_text(labels)} {total}")
+            lines.append(f"{self.name}_count{labels_text(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """the metrics of the process, in the order they are rendered"""
+
+    def __init__(self):
+        self.metrics: list[Counter | Gauge | Histogram] = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for m in self.metrics for line in m.render()) + "\n"
+
+
+METRICS = Registry()
+REQUESTS = METRICS.add(
+    Counter("http_requests_total", "HTTP requests", ("path", "status"))
+)
+IN_FLIGHT = METRICS.add(Gauge("http_requests_in_flight", "HTTP requests being served"))
+REQUEST_SECONDS = METRICS.add(
+    Histogram("http_request_duration_seconds", "HTTP request latency", ("path",))
+)
+STAGE_SECONDS = METRICS.add(
+    Histogram(
+        "scoring_stage_duration_seconds",
+        "time spent per stage of scoring requests",
+        ("stage",),
+    )
+)
+READINGS = METRICS.add(Counter("readings_scored_total", "sensor readings scored"))
+ANOMALIES = METRICS.add(Counter("anomalies_total", "readings flagged as anomalies"))
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage)
+
+
+def mark(name: str) -> float:
+    """records a timestamp of the current request (e.g. "handler", "handled")"""
+    now = time.perf_counter()
+    times = REQUEST_TIMES.get()
+    if times is not None:
+        times[name] = now
+    return now
+
+
+class MetricsMiddleware:
+    """
+    pure ASGI middleware (no extra task per request): counts & times HTTP requests
+    and derives the validation & serialization stages from the marks set by endpoints
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        times: dict[str, float] = {"received": time.perf_counter()}
+        token = REQUEST_TIMES.set(times)
+        status: list[int] = [500]
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if "handled" in times:
+                    serialized = time.perf_counter() - times["handled"]
+                    observe_stage("serialization", serialized)
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            IN_FLIGHT.inc(-1)
+            REQUEST_TIMES.reset(token)
+            route = scope.get("route")
+            path: str = getattr(route, "path", "unmatched")
+            REQUESTS.inc(1, path, str(status[0]))
+            REQUEST_SECONDS.observe(time.perf_counter() - times["received"], path)
+            if "handler" in times:
+                observe_stage("validation", times["handler"] - times["received"])
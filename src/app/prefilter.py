@@ -0,0 +1,210 @@
+"""
+Statistical prefilter ahead of the forest (main.py, PREFILTER=1)
+train.py saves the mean & covariance of the normal training rows with the model;
+a reading's Mahalanobis distance d to that mean costs a few multiply-adds:
+- d < normal_below: plainly normal, not sent to the forest
+- d > anomaly_above: plainly anomalous, not sent to the forest
+- in between: scored by the forest
+most traffic is plainly normal, so most readings skip the tree walks
+
+the bands are calibrated (or, if configured, checked) against the forest on
+synthetic readings at known distances: a band is only used if the forest agrees
+with it on at least min_agreement of the readings inside it (the forest only
+splits on 1 feature at a time: far out along 1 feature, it often still finds a
+reading normal, so the anomaly band may well end up unused)
+a reading decided by the prefilter gets the forest's typical score at its distance
+(median per distance bin, from the calibration), kept on the decided side of 0
+"""
+
+import threading
+
+import numpy as np
+
+from src.app.engine import Engine
+
+CALIBRATION_ROWS: int = 20_000  # synthetic readings scored by the forest at load
+NEAR_DISTANCE: float = 8.0  # half of them within this distance, the rest up to FAR
+FAR_DISTANCE: float = 64.0
+SCORE_BINS: int = 64  # distance bins of the distance -> score map
+MIN_AGREEMENT: float = 0.999
+MIN_BAND_ROWS: int = 100  # a band with fewer calibration rows is not checked: unused
+
+
+class Prefilter:
+    """an engine (same contract) that only sends the uncertain band to the forest"""
+
+    version: int = 0
+    stateful: bool = False
+
+    def __init__(
+        self,
+        engine: Engine,
+        normal_below: float | None,
+        anomaly_above: float | None,
+        map_distance: np.ndarray,
+        map_score: np.ndarray,
+        calibration: dict[str, float | int],
+    ):
+        """raises ValueError if the model has no (usable) training statistics"""
+        if engine.feature_mean is None or engine.feature_cov is None:
+            raise ValueError("the model has no training statistics, retrain it")
+        self.engine = engine
+        self.name: str = f"{engine.name}+prefilter"
+        self.feature_mean = engine.feature_mean
+        self.feature_cov = engine.feature_cov
+        self._mean: np.ndarray = engine.feature_mean
+        try:
+            self.precision: np.ndarray = np.linalg.inv(engine.feature_cov)
+        except np.linalg.LinAlgError:
+            raise ValueError("the training covariance is singular")
+        self.normal_below = normal_below  # None: band not used
+        self.anomaly_above = anomaly_above
+        # compared with squared distances: no square root per reading
+        self._normal_d2 = -np.inf if normal_below is None else normal_below**2
+        self._anomaly_d2 = np.inf if anomaly_above is None else anomaly_above**2
+        self._map_d2 = map_distance**2
+        self._map_score = map_score
+        self.calibration = calibration
+        # statistics, for /status (score() runs on several executor threads)
+        self._lock = threading.Lock()
+        self.n_rows: int = 0
+        self.n_normal: int = 0
+        self.n_anomalous: int = 0
+
+    def distance2(self, X: np.ndarray) -> np.ndarray:
+        """squared Mahalanobis distance of each row to the training mean"""
+        centered = X - self._mean
+        return np.einsum("ij,jk,ik->i", centered, self.precision, centered)
+
+    def score(self, features: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        X = np.asarray(features, dtype=np.float64).reshape(-1, len(self._mean))
+        d2 = self.distance2(X)
+        normal = d2 < self._normal_d2
+        anomalous = d2 > self._anomaly_d2
+        n_normal, n_anomalous = int(normal.sum()), int(anomalous.sum())
+        with self._lock:
+            self.n_rows += len(X)
+            self.n_normal += n_normal
+            self.n_anomalous += n_anomalous
+        if n_normal + n_anomalous == 0:
+            return self.engine.score(X)
+
+        scores = np.interp(d2, self._map_d2, self._map_score)
+        scores[normal] = np.maximum(scores[normal], 0.0)
+        scores[anomalous] = np.minimum(scores[anomalous], -1e-9)
+        is_anomaly = anomalous.copy()
+        uncertain = np.flatnonzero(~(normal | anomalous))
+        if len(uncertain):
+            is_anomaly[uncertain], scores[uncertain] = self.engine.score(X[uncertain])
+        return is_anomaly, scores
+
+    def stats(self) -> dict[str, float | int | str]:
+        with self._lock:
+            n_rows, n_normal, n_anomalous = self.n_rows, self.n_normal, self.n_anomalous
+        decided = n_normal + n_anomalous
+        off = "off"  # band not used
+        return {
+            "normal_below": off if self.normal_below is None else self.normal_below,
+            "anomaly_above": off if self.anomaly_above is None else self.anomaly_above,
+            "rows": n_rows,
+            "decided_normal": n_normal,
+            "decided_anomalous": n_anomalous,
+            "hit_ratio": decided / n_rows if n_rows else 0.0,
+            **self.calibration,
+        }
+
+
+def calibration_rows(
+    mean: np.ndarray, cov: np.ndarray, n_rows: int, seed: int = 0
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    readings in random directions around the mean, at known Mahalanobis distances
+    (half uniform within NEAR_DISTANCE, half between it & FAR_DISTANCE)
+    output: (rows, distances)
+    """
+    rng = np.random.default_rng(seed)
+    directions = rng.standard_normal((n_rows, len(mean)))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    near = n_rows // 2
+    distances = np.concatenate(
+        (
+            rng.uniform(0, NEAR_DISTANCE, near),
+            rng.uniform(NEAR_DISTANCE, FAR_DISTANCE, n_rows - near),
+        )
+    )
+    # x = mean + L z with L L' = cov: the distance of x is |z|
+    L = np.linalg.cholesky(cov)
+    return mean + (directions * distances[:, None]) @ L.T, distances
+
+
+def agreement(flags: np.ndarray) -> float:
+    """share of the calibration rows in a band on which the forest agrees"""
+    return float(flags.mean()) if len(flags) >= MIN_BAND_ROWS else 0.0
+
+
+def calibrate(
+    engine: Engine,
+    normal_below: float | None = None,
+    anomaly_above: float | None = None,
+    min_agreement: float = MIN_AGREEMENT,
+) -> Prefilter:
+    """
+    wraps engine in a prefilter; bands not given are the widest ones on which the
+    forest agrees at least min_agreement, given ones are dropped if it does not
+    raises ValueError if the model has no (usable) training statistics
+    """
+    if engine.stateful:  # calibration would feed it 20k synthetic readings
+        raise ValueError(f"the {engine.name} engine adapts by itself")
+    if engine.feature_mean is None or engine.feature_cov is None:
+        raise ValueError("the model has no training statistics, retrain it")
+    try:
+        X, distances = calibration_rows(
+            engine.feature_mean, engine.feature_cov, CALIBRATION_ROWS
+        )
+    except np.linalg.LinAlgError:
+        raise ValueError("the training covariance is singular")
+    order = np.argsort(distances)
+    distances = distances[order]
+    is_anomaly, scores = engine.score(X[order])
+    n = len(distances)
+
+    if normal_below is None:
+        # share of normal flags among the rows closer than each row
+        inside = np.cumsum(~is_anomaly) / np.arange(1, n + 1)
+        ok = np.flatnonzero(inside >= min_agreement)
+        normal_below = float(distances[ok[-1]]) if len(ok) else None
+    if anomaly_above is None:
+        # share of anomaly flags among the rows further than each row
+        outside = (np.cumsum(is_anomaly[::-1]) / np.arange(1, n + 1))[::-1]
+        ok = np.flatnonzero(outside >= min_agreement)
+        anomaly_above = float(distances[ok[0]]) if len(ok) else None
+
+    # checked on the calibration rows (again, if calibrated): unused if it fails
+    report: dict[str, float | int] = {"calibration_rows": n}
+    if normal_below is not None:
+        report["normal_agreement"] = agreement(~is_anomaly[distances < normal_below])
+        if report["normal_agreement"] < min_agreement:
+            normal_below = None
+    if anomaly_above is not None:
+        report["anomaly_agreement"] = agreement(is_anomaly[distances > anomaly_above])
+        if report["anomaly_agreement"] < min_agreement:
+            anomaly_above = None
+    if (
+        normal_below is not None
+        and anomaly_above is not None
+        and normal_below > anomaly_above
+    ):
+        raise ValueError("the normal & anomaly bands overlap")
+
+    # distance -> median forest score, per bin of calibration rows
+    bins = np.array_split(np.arange(n), SCORE_BINS)
+    map_distance = np.array([distances[b].mean() for b in bins])
+    map_score = np.array([np.median(scores[b]) for b in bins])
+    return Prefilter(
+        engine,
+        normal_below,
+        anomaly_above,
+        map_distance,
+        map_score,
+        report | {"min_agreement": min_agreement},
+    )
@@ -0,0 +1,129 @@
+"""
+Per-device models for the API server (main.py)
+a device (sensor_id) with its own <sensor_id>.joblib in the model directory is
+scored with that model, any other device with the global one:
+- models are loaded on first use (then memory-mapped, like the global model)
+- at most `capacity` stay loaded (least recently used are evicted), so memory is
+  bounded whatever the number of devices
+- devices without a model file are remembered for a while, so they cost no disk access
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from src.app.engine import Engine, load_model
+
+MISSING_CAPACITY: int = 100_000  # devices remembered as "no model file"
+MISSING_TTL_S: float = 60.0  # ... until a file dropped in later is looked for again
+
+
+class ModelRegistry:
+    """LRU cache of per-device engines, loaded lazily from model_dir"""
+
+    def __init__(self, model_dir: str, kind: str, capacity: int):
+        self.model_dir = model_dir
+        self.kind = kind  # inference engine, as INFERENCE_ENGINE
+        self.capacity = capacity
+        self.version: int = 1  # of the device models, +1 on clear()
+        self._engines: OrderedDict[str, Engine] = OrderedDict()
+        self._missing: OrderedDict[str, float] = OrderedDict()  # id: expiry
+        self._lock = threading.Lock()  # guards both caches
+        self._load_lock = threading.Lock()  # 1 cold load at a time
+        # statistics, for /status
+        self.n_hits: int = 0
+        self.n_fallbacks: int = 0  # devices without a model of their own
+        self.n_loads: int = 0
+        self.n_evictions: int = 0
+        self.total_load: float = 0.0
+        self.max_load: float = 0.0
+        self.last_load_ms: float = 0.0
+
+    def model_file(self, sensor_id: str) -> str:
+        return os.path.join(self.model_dir, f"{sensor_id}.joblib")
+
+    def cached(self, sensor_id: str) -> tuple[bool, Engine | None]:
+        """
+        without any disk access: (known, the device's engine or None to fall back)
+        known is False if get() has to look for a model file first
+        """
+        with self._lock:
+            engine = self._engines.get(sensor_id)
+            if engine is not None:
+                self._engines.move_to_end(sensor_id)
+                self.n_hits += 1
+                return True, engine
+            expiry = self._missing.get(sensor_id)
+            if expiry is not None and expiry > time.monotonic():
+                self.n_fallbacks += 1
+                return True, None
+        return False, None
+
+    def get(self, sensor_id: str) -> Engine | None:
+        """the device's engine (loaded on a miss), None if it has no model file"""
+        known, engine = self.cached(sensor_id)
+        if known:
+            return engine
+        with self._load_lock:
+            known, engine = self.cached(sensor_id)  # loaded meanwhile?
+            if known:
+                return engine
+            return self._load(sensor_id)
+
+    def _load(self, sensor_id: str) -> Engine | None:
+        start = time.perf_counter()
+        try:
+            engine, _ = load_model(
+                self.model_file(sensor_id),
+                self.kind,
+                os.path.join(self.model_dir, f"{sensor_id}.flat"),
+            )
+        except FileNotFoundError:
+            with self._lock:
+                self._missing[sensor_id] = time.monotonic() + MISSING_TTL_S
+                self._missing.move_to_end(sensor_id)
+                if len(self._missing) > MISSING_CAPACITY:
+                    self._missing.popitem(last=False)
+                self.n_fallbacks += 1
+            return None
+        seconds = time.perf_counter() - start
+        engine.version = self.version
+        with self._lock:
+            self._engines[sensor_id] = engine
+            if len(self._engines) > self.capacity:
+                self._engines.popitem(last=False)
+                self.n_evictions += 1
+            self._missing.pop(sensor_id, None)
+            self.n_loads += 1
+            self.total_load += seconds
+            self.max_load = max(self.max_load, seconds)
+            self.last_load_ms = 1_000 * seconds
+        return engine
+
+    def clear(self) -> None:
+        """forgets all device models (reloaded from disk on next use)"""
+        with self._lock:
+            self._engines.clear()
+            self._missing.clear()
+            self.version += 1
+
+    def loaded(self) -> int:
+        return len(self._engines)
+
+    def stats(self) -> dict[str, float | int | str]:
+        return {
+            "model_dir": self.model_dir,
+            "loaded": self.loaded(),
+            "capacity": self.capacity,
+            "version": self.version,
+            "hits": self.n_hits,
+            "fallbacks": self.n_fallbacks,
+            "cold_loads": self.n_loads,
+            "evictions": self.n_evictions,
+            "mean_cold_load_ms": (
+                1_000 * self.total_load / self.n_loads if self.n_loads else 0
+            ),
+            "max_cold_load_ms": 1_000 * self.max_load,
+            "last_cold_load_ms": self.last_load_ms,
+        }
@@ -0,0 +1,68 @@
+"""
+Model hot-swap for the API server (main.py), without a restart:
+- the new model.joblib is fitted in a separate process (the API's GIL is not shared)
+- it is then loaded, compiled & validated in a worker thread (off the event loop)
+- only a model that passed validation is swapped in, by main.py
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.app.engine import Engine, load_engine
+from src.app.streaming import StreamEngine
+
+VALIDATION_ROWS: int = 10_000  # rows of training data scored by a candidate model
+MAX_ANOMALY_RATIO: float = 0.05  # the forest is fitted with contamination=0.01
+
+
+def fit_candidate(input_file: str, candidate_file: str, n_jobs: int) -> None:
+    """runs in the child process: out-of-core training into candidate_file"""
+    from src.training.train import train_model_out_of_core
+
+    train_model_out_of_core(input_file, candidate_file, n_jobs=n_jobs)
+    if not os.path.exists(candidate_file):  # train.py only prints its errors
+        raise FileNotFoundError(f"training did not produce {candidate_file}")
+
+
+async def fit_in_process(input_file: str, candidate_file: str, n_jobs: int) -> None:
+    """fits a candidate model in a fresh process, awaits it without blocking"""
+    context = multiprocessing.get_context("spawn")  # no fork of the server's threads
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        await asyncio.get_running_loop().run_in_executor(
+            pool, fit_candidate, input_file, candidate_file, n_jobs
+        )
+
+
+def build_candidate(candidate_file: str, kind: str) -> Engine:
+    """loads & compiles a candidate model.joblib (no cache: it is not in use yet)"""
+    import joblib
+
+    return load_engine(joblib.load(candidate_file), kind)
+
+
+def validate_engine(engine: Engine, input_file: str) -> dict[str, float]:
+    """
+    scores the first rows of the training data with an engine before it is used
+    (a stream engine is reset afterwards: these rows must not shift its state)
+    raises ValueError if the scores are not finite or too many rows are flagged
+    """
+    from src.training.train import iter_chunks
+
+    X: np.ndarray | None = next(iter_chunks(input_file, VALIDATION_ROWS), None)
+    if X is None or not len(X):
+        raise ValueError(f"no validation data in {input_file}")
+    is_anomaly, scores = engine.score(X)
+    if isinstance(engine, StreamEngine):
+        engine.reset()
+    if not np.all(np.isfinite(scores)):
+        raise ValueError("model produces non-finite scores")
+    ratio = float(np.mean(is_anomaly))
+    if ratio > MAX_ANOMALY_RATIO:
+        raise ValueError(
+            f"model flags {ratio:.1%} of the training data, max {MAX_ANOMALY_RATIO:.0%}"
+        )
+    return {"validation_rows": len(X), "anomaly_ratio": ratio}
@@ -0,0 +1,91 @@
+"""
+Score cache for the API server (main.py, SCORE_CACHE_SIZE > 0): readings are
+quantized to a resolution (e.g. 0.001, the sim's rounding), and a reading whose
+quantized values were scored recently by the same engine gets that score back
+without running the model, so repeated & flat-lining readings cost a dict lookup
+- bounded: at most `capacity` entries, least recently used evicted first
+- entries expire after ttl_s, and are all dropped when the model changes
+- not used for stateful engines (their score depends on the readings before)
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from src.app.engine import Engine
+
+
+class ScoreCache:
+    """LRU/TTL cache of (is_anomaly, score), per engine & quantized reading"""
+
+    def __init__(self, resolution: float, capacity: int, ttl_s: float):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.ttl_s = ttl_s
+        # (engine, quantized values...): (is_anomaly, score, expiry)
+        # an entry holds its engine: a model swapped out is freed with its entries
+        self._entries: OrderedDict[tuple, tuple[bool, float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        # statistics, for /status
+        self.n_hits: int = 0
+        self.n_misses: int = 0
+
+    def keys(self, engine: Engine, features: np.ndarray) -> list[tuple]:
+        # multiples of the resolution (as floats: no overflow, NaN never matches)
+        quantized = np.round(np.asarray(features, dtype=np.float64) / self.resolution)
+        return [(engine, *row) for row in quantized.tolist()]
+
+    def score(
+        self, engine: Engine, features: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """engine.score(features), only called for the rows not in the cache"""
+        keys = self.keys(engine, features)
+        is_anomaly = np.zeros(len(keys), dtype=bool)
+        scores = np.zeros(len(keys))
+        missing: list[int] = []
+        now = time.monotonic()
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None and entry[2] > now:
+                    self._entries.move_to_end(key)
+                    is_anomaly[i], scores[i] = entry[0], entry[1]
+                else:
+                    missing.append(i)
+            self.n_hits += len(keys) - len(missing)
+            self.n_misses += len(missing)
+        if not missing:
+            return is_anomaly, scores
+
+        flags, values = engine.score(np.asarray(features)[missing])
+        is_anomaly[missing], scores[missing] = flags, values
+        expiry = now + self.ttl_s
+        with self._lock:
+            for i, flag, value in zip(missing, flags.tolist(), values.tolist()):
+                self._entries[keys[i]] = (flag, value, expiry)
+                self._entries.move_to_end(keys[i])
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return is_anomaly, scores
+
+    def clear(self) -> None:
+        """forgets every score (on a model change)"""
+        with self._lock:
+            self._entries.clear()
+
+    def hit_ratio(self) -> float:
+        total = self.n_hits + self.n_misses
+        return self.n_hits / total if total else 0.0
+
+    def stats(self) -> dict[str, float | int]:
+        return {
+            "entries": len(self._entries),
+            "capacity": self.capacity,
+            "resolution": self.resolution,
+            "ttl_s": self.ttl_s,
+            "hits": self.n_hits,
+            "misses": self.n_misses,
+            "hit_ratio": self.hit_ratio(),
+        }
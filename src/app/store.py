@@ -0,0 +1,285 @@
+"""
+Durable history of scored events for the API server (main.py)
+an append-only SQLite log in WAL mode, indexed by timestamp:
+- scoring only queues the arrays; a writer thread inserts them in batches,
+  1 transaction per flush, so /score never waits for the disk
+- all uvicorn workers append to the same file, and it survives restarts
+- time-range queries are answered from the index, not by scanning the log
+- a per-second rollup (count, min/max/sum of scores, anomalies) is kept up to date
+  in the same transactions, so long ranges are aggregated without reading every event
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import numpy as np
+
+from src.app.aggregate import AGGREGATE_COLUMNS, bucket_stats
+from src.app.history import COLUMNS
+
+FLUSH_INTERVAL_S: float = 0.2  # max. time events wait in memory before the insert
+MAX_PENDING: int = 10_000  # queued batches; beyond, new events are dropped (counted)
+BUSY_TIMEOUT_S: float = 5.0  # wait for another worker's write transaction
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS scores (
+    timestamp INTEGER NOT NULL,  -- UTC, ns since epoch
+    temperature_c REAL NOT NULL,
+    humidity_pct REAL NOT NULL,
+    sound_db REAL NOT NULL,
+    is_anomaly INTEGER NOT NULL,
+    anomaly_score REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_timestamp ON scores (timestamp);
+CREATE TABLE IF NOT EXISTS score_seconds (
+    second INTEGER PRIMARY KEY,  -- UTC, s since epoch
+    count INTEGER NOT NULL,
+    min_score REAL NOT NULL,
+    max_score REAL NOT NULL,
+    sum_score REAL NOT NULL,
+    anomalies INTEGER NOT NULL
+);
+"""
+# fills the rollup of a log written before it existed (no-op on a new log)
+BACKFILL: str = """
+INSERT OR IGNORE INTO score_seconds
+SELECT timestamp / 1000000000, count(*), min(anomaly_score), max(anomaly_score),
+       sum(anomaly_score), sum(is_anomaly)
+FROM scores GROUP BY 1
+"""
+INSERT: str = f"INSERT INTO scores VALUES ({', '.join('?' * len(COLUMNS))})"
+SELECT: str = (
+    f"SELECT {', '.join(COLUMNS)} FROM scores"
+    " WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp LIMIT ?"
+)
+
+UPSERT_SECOND: str = """
+INSERT INTO score_seconds VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (second) DO UPDATE SET
+    count = count + excluded.count,
+    min_score = min(min_score, excluded.min_score),
+    max_score = max(max_score, excluded.max_score),
+    sum_score = sum_score + excluded.sum_score,
+    anomalies = anomalies + excluded.anomalies
+"""
+# aggregates, per bucket of ? ns (or ? s for the rollup), of the events in [?, ?)
+AGGREGATE_EVENTS: str = """
+SELECT timestamp / ?1 * ?1, count(*), min(anomaly_score), max(anomaly_score),
+       avg(anomaly_score), sum(is_anomaly)
+FROM scores WHERE timestamp >= ?2 AND timestamp < ?3 GROUP BY 1 ORDER BY 1
+"""
+AGGREGATE_SECONDS: str = """
+SELECT second / ?1 * ?1, sum(count), min(min_score), max(max_score),
+       sum(sum_score) / sum(count), sum(anomalies)
+FROM score_seconds WHERE second >= ?2 AND second < ?3 GROUP BY 1 ORDER BY 1
+"""
+SELECT_SERIES: str = """
+SELECT timestamp, anomaly_score FROM scores
+WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp LIMIT ?
+"""
+SELECT_SECONDS: str = """
+SELECT second, min_score FROM score_seconds
+WHERE second >= ? AND second < ? ORDER BY second
+"""
+
+Batch = tuple[int, np.ndarray, np.ndarray, np.ndarray]
+
+
+def clamp_ns(timestamp_ns: int) -> int:
+    """timestamps are stored as int64 (years 1677 to 2262)"""
+    return min(max(timestamp_ns, -(2**63)), 2**63 - 1)
+
+
+class ScoreStore:
+    """append-only, time-indexed log of scored events in 1 SQLite file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")  # readers never block the writer
+            db.executescript(SCHEMA)
+            with db:
+                if db.execute("SELECT count(*) FROM score_seconds").fetchone()[0] == 0:
+                    db.execute(BACKFILL)
+        self._pending: queue.Queue[Batch | None] = queue.Queue(maxsize=MAX_PENDING)
+        self._thread: threading.Thread | None = None
+        # statistics, for /status
+        self.n_written: int = 0
+        self.n_dropped: int = 0
+        self.n_flushes: int = 0
+        self.max_flush: float = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_S, check_same_thread=False)
+        db.execute("PRAGMA synchronous=NORMAL")  # in WAL mode: no fsync per commit
+        return db
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="score-store", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """writes what is still queued, then ends the writer thread"""
+        if self._thread:
+            self._pending.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def append(
+        self,
+        timestamp_ns: int,
+        features: np.ndarray,
+        is_anomaly: np.ndarray,
+        scores: np.ndarray,
+    ) -> None:
+        """queues a batch of scored readings (all with the same timestamp)"""
+        try:
+            self._pending.put_nowait((timestamp_ns, features, is_anomaly, scores))
+        except queue.Full:  # the disk can't keep up: don't slow down scoring
+            self.n_dropped += len(scores)
+
+    def _run(self) -> None:
+        db = self._connect()
+        stopping: bool = False
+        while not stopping:
+            batches: list[Batch] = []
+            item = self._pending.get()
+            deadline = time.perf_counter() + FLUSH_INTERVAL_S
+            while item is not None:
+                batches.append(item)
+                try:
+                    item = self._pending.get(
+                        timeout=max(0.0, deadline - time.perf_counter())
+                    )
+                except queue.Empty:
+                    break
+            stopping = item is None
+            if batches:
+                self._write(db, batches)
+        db.close()
+
+    def _write(self, db: sqlite3.Connection, batches: list[Batch]) -> None:
+        """inserts the queued batches & updates the rollup, in 1 transaction"""
+        start = time.perf_counter()
+        n_rows: int = 0
+        # the rollup rows (a second repeated if out of order: the upsert merges it)
+        seconds = bucket_stats(
+            np.repeat([b[0] for b in batches], [len(b[3]) for b in batches]),
+            np.concatenate([b[3] for b in batches]),
+            np.concatenate([b[2] for b in batches]),
+            1_000_000_000,
+        )
+        try:
+            with db:
+                for timestamp_ns, features, is_anomaly, scores in batches:
+                    db.executemany(
+                        INSERT,
+                        zip(
+                            [timestamp_ns] * len(scores),
+                            features[:, 0].tolist(),
+                            features[:, 1].tolist(),
+                            features[:, 2].tolist(),
+                            np.asarray(is_anomaly, dtype=int).tolist(),
+                            scores.tolist(),
+                        ),
+                    )
+                    n_rows += len(scores)
+                db.executemany(
+                    UPSERT_SECOND,
+                    zip(
+                        (seconds["timestamp"] // 1_000_000_000).tolist(),
+                        seconds["count"].tolist(),
+                        seconds["min_score"].tolist(),
+                        seconds["max_score"].tolist(),
+                        (seconds["mean_score"] * seconds["count"]).tolist(),
+                        seconds["anomalies"].tolist(),
+                    ),
+                )
+        except sqlite3.Error as e:
+            self.n_dropped += sum(len(b[3]) for b in batches)
+            print(f"could not write scores into {self.path}: {e}")
+            return
+        self.n_written += n_rows
+        self.n_flushes += 1
+        self.max_flush = max(self.max_flush, time.perf_counter() - start)
+
+    def query(self, start_ns: int, end_ns: int, limit: int) -> dict[str, np.ndarray]:
+        """events with start_ns <= timestamp < end_ns, oldest first, column-wise"""
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                SELECT, (clamp_ns(start_ns), clamp_ns(end_ns), limit)
+            ).fetchall()
+        values = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+        return {
+            name: np.array(column, dtype=dtype)
+            for (name, dtype), column in zip(COLUMNS.items(), values)
+        }
+
+    def aggregate(
+        self, start_ns: int, end_ns: int, bucket_ns: int
+    ) -> dict[str, np.ndarray]:
+        """
+        per bucket of bucket_ns: count, min/max/mean score & anomalies (bucket_stats)
+        whole seconds are read from the rollup, only finer buckets from the events
+        """
+        start_ns, end_ns = clamp_ns(start_ns), clamp_ns(end_ns)
+        if bucket_ns % 1_000_000_000 == 0:
+            args = (
+                bucket_ns // 1_000_000_000,
+                -(-start_ns // 1_000_000_000),  # seconds that start in the range
+                -(-end_ns // 1_000_000_000),
+            )
+            sql, unit = AGGREGATE_SECONDS, 1_000_000_000
+        else:
+            args, sql, unit = (bucket_ns, start_ns, end_ns), AGGREGATE_EVENTS, 1
+        with closing(self._connect()) as db:
+            rows = db.execute(sql, args).fetchall()
+        values = list(zip(*rows)) if rows else [()] * len(AGGREGATE_COLUMNS)
+        columns = {
+            name: np.array(column, dtype=np.float64 if "score" in name else np.int64)
+            for name, column in zip(AGGREGATE_COLUMNS, values)
+        }
+        columns["timestamp"] *= unit
+        return columns
+
+    def series(
+        self, start_ns: int, end_ns: int, max_events: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (timestamps, scores) of the events in the range, for downsampling
+        if there are more than max_events: the lowest (worst) score of each second
+        """
+        start_ns, end_ns = clamp_ns(start_ns), clamp_ns(end_ns)
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                SELECT_SERIES, (start_ns, end_ns, max_events + 1)
+            ).fetchall()
+            unit: int = 1
+            if len(rows) > max_events:
+                unit = 1_000_000_000
+                rows = db.execute(
+                    SELECT_SECONDS, (-(-start_ns // unit), -(-end_ns // unit))
+                ).fetchall()
+        if not rows:
+            return np.array([], dtype=np.int64), np.array([])
+        timestamps, scores = zip(*rows)
+        return np.array(timestamps, dtype=np.int64) * unit, np.array(scores)
+
+    def stats(self) -> dict[str, float | int | str]:
+        return {
+            "path": self.path,
+            "written": self.n_written,
+            "pending_batches": self._pending.qsize(),
+            "dropped": self.n_dropped,
+            "flushes": self.n_flushes,
+            "max_flush_ms": 1_000 * self.max_flush,
+        }
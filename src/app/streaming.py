@@ -0,0 +1,108 @@
+"""
+Streaming inference engine (INFERENCE_ENGINE=stream): robust, exponentially
+weighted statistics per feature, updated with every reading at constant cost &
+memory, so the detector follows slow drift (e.g. seasonal temperature & humidity)
+without retraining
+- a reading is scored against the state before it: d is its distance to the running
+  mean in running std. deviations (all features), score = 1 - d / THRESHOLD
+  (same contract as the forest: below 0 is an anomaly, but not the same scale)
+- the state then moves towards the reading, with the deviation clipped at CLIP
+  std. deviations: an anomaly barely moves it, a lasting shift is followed gradually
+- it starts from the training mean & variance saved in model.joblib (train.py),
+  or for older models learns them from the first WARMUP readings (scored as normal)
+every uvicorn worker (and every device model) has its own state, lost on restart
+"""
+
+import threading
+
+import numpy as np
+
+HALF_LIFE: int = 10_000  # readings after which an old reading weighs half as much
+THRESHOLD: float = 4.5  # std. deviations (chi, 3 features: ~0.02% false positives)
+CLIP: float = 3.0  # std. deviations, max. deviation a reading updates the state by
+WARMUP: int = 100  # readings to learn the first state from, without training stats
+MIN_VAR: float = 1e-12  # keeps a constant feature from dividing by 0
+
+
+class StreamEngine:
+    """online detector: O(1) time & memory per reading, same score() contract"""
+
+    name: str = "stream"
+    version: int = 0
+    stateful: bool = True
+
+    def __init__(
+        self,
+        feature_mean: np.ndarray | None,
+        feature_cov: np.ndarray | None,
+        n_features: int = 3,
+        half_life: int = HALF_LIFE,
+    ):
+        self.feature_mean = feature_mean  # training stats, as the other engines
+        self.feature_cov = feature_cov
+        self.n_features = n_features
+        self.alpha: float = 1.0 - 0.5 ** (1.0 / half_life)
+        self._lock = threading.Lock()  # scoring & updating is 1 step
+        self.reset()
+
+    def reset(self) -> None:
+        """back to the state before any reading: the training stats, if known"""
+        with self._lock:
+            # running state, None until known
+            self.mean: np.ndarray | None = None
+            self.var: np.ndarray | None = None
+            if self.feature_mean is not None and self.feature_cov is not None:
+                self.mean = np.array(self.feature_mean, dtype=np.float64)
+                self.var = np.maximum(np.diag(self.feature_cov), MIN_VAR)
+            self._warmup: list[np.ndarray] = []
+            self.n_seen: int = 0
+
+    def _learn_warmup(self, X: np.ndarray) -> int:
+        """adds rows to the warm-up, returns how many it took"""
+        taken = min(len(X), WARMUP - sum(len(rows) for rows in self._warmup))
+        self._warmup.append(X[:taken])
+        rows = np.concatenate(self._warmup)
+        if len(rows) == WARMUP:
+            self.mean = rows.mean(axis=0)
+            self.var = np.maximum(rows.var(axis=0, ddof=1), MIN_VAR)
+            self._warmup = []
+        return taken
+
+    def score(self, features: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """scores rows in order, then updates the state with them (1 vectorized step)"""
+        X = np.asarray(features, dtype=np.float64).reshape(-1, self.n_features)
+        is_anomaly = np.zeros(len(X), dtype=bool)
+        scores = np.zeros(len(X))
+        with self._lock:
+            start = self._learn_warmup(X) if self.mean is None else 0
+            self.n_seen += len(X)
+            n = len(X) - start
+            mean, var = self.mean, self.var  # known once the warm-up is done
+            if n == 0 or mean is None or var is None:
+                return is_anomaly, scores
+
+            std = np.sqrt(var)
+            deviations = X[start:] - mean
+            d = np.sqrt(((deviations / std) ** 2).sum(axis=1))
+            scores[start:] = 1.0 - d / THRESHOLD
+            is_anomaly[start:] = scores[start:] < 0
+
+            # n sequential updates mean += a * dev, var = (1 - a) * (var + a * dev^2),
+            # with each row's deviation taken from the state before the batch
+            clipped = np.clip(deviations, -CLIP * std, CLIP * std)
+            weights = self.alpha * (1.0 - self.alpha) ** np.arange(n - 1, -1, -1)
+            self.mean = mean + weights @ clipped
+            self.var = np.maximum(
+                (1.0 - self.alpha) ** n * var
+                + (1.0 - self.alpha) * (weights @ clipped**2),
+                MIN_VAR,
+            )
+        return is_anomaly, scores
+
+    def stats(self) -> dict[str, float | int | list[float]]:
+        return {
+            "readings": self.n_seen,
+            "half_life": round(np.log(0.5) / np.log(1.0 - self.alpha)),
+            "mean": [] if self.mean is None else self.mean.round(3).tolist(),
+            "std": [] if self.var is None else np.sqrt(self.var).round(3).tolist(),
+        }
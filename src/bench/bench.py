@@ -0,0 +1,349 @@
+"""
+Benchmark suite, runs fully offline (no server, no network), from the repo root:
+    python -m src.bench.bench [--quick] [--output FILE] [--baseline FILE]
+
+measures:
+- POST /score latency & throughput, in-process against the FastAPI app
+- model load time (joblib.load of model.joblib, and inference engine build)
+- train_model wall time & peak memory, at several training data sizes
+- generate_all rows per second
+- GET /recent_scores serialization cost, at several history sizes
+- durable score log: sustained write rate, and time-range query latency
+- inference engines (forest vs. streaming) on sim.py data, stationary & drifting:
+  readings per second and precision / recall of the flagged anomalies
+- the flat engine's scores vs. sklearn's decision_function, down to forests of
+  single-sample trees: how many models differ (0 expected)
+
+results are saved as JSON; with --baseline, every metric is compared to an
+earlier run and the run fails (exit code 1) if one regressed more than --threshold
+"""
+
+import argparse
+import atexit
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import numpy as np
+from fastapi.testclient import TestClient
+from sklearn.ensemble import IsolationForest
+
+# read by main.py at import: the API under test must not write the real score log
+# (SCORE_DB) nor rebuild the real model cache, so both go to a scratch directory
+SCRATCH_DIR: str = tempfile.mkdtemp(prefix="bench-")
+atexit.register(shutil.rmtree, SCRATCH_DIR, ignore_errors=True)
+os.environ["SCORE_DB"] = ""
+os.environ["MODEL_CACHE_DIR"] = os.path.join(SCRATCH_DIR, "model.flat")
+
+import src.app.main as api
+from src.app.engine import VERIFY_TOLERANCE, Engine, FlatForest, load_engine, verify
+from src.app.history import ScoreRing
+from src.app.store import ScoreStore
+from src.sim.sim import TRAINING_ANOMALY_EVERY, generate_all, generate_block
+from src.training.train import train_model
+
+OUTPUT_FILE: str = "./bench-results.json"
+THRESHOLD: float = 0.25  # allowed relative regression per metric
+# metrics are "lower is better", except those ending with one of these
+HIGHER_IS_BETTER: tuple[str, ...] = ("_per_s", "precision", "recall")
+FLAT_PARITY_SAMPLES: list[int] = [1, 2, 64, 256]  # max_samples of the checked forests
+
+Results = dict[str, dict[str, float]]
+
+
+def timed(func: Callable[[], object], repeat: int) -> list[float]:
+    """wall time in seconds of each of `repeat` calls"""
+    times: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def quiet() -> contextlib.redirect_stdout:
+    """silences the prints of the code under test"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def bench_score(client: TestClient, n_requests: int) -> dict[str, float]:
+    """POST /score, 1 request after the other (latency), in-process"""
+    payload = {"temperature_c": 21.0, "humidity_pct": 60.0, "sound_db": 50.0}
+    for _ in range(10):  # warm-up
+        client.post("/score", json=payload)
+    latencies = sorted(
+        timed(lambda: client.post("/score", json=payload), n_requests)
+    )
+    return {
+        "p50_ms": 1_000 * latencies[len(latencies) // 2],
+        "p95_ms": 1_000 * latencies[int(0.95 * (len(latencies) - 1))],
+        "p99_ms": 1_000 * latencies[int(0.99 * (len(latencies) - 1))],
+        "requests_per_s": len(latencies) / sum(latencies),
+    }
+
+
+def bench_score_batch(client: TestClient, batch_size: int) -> dict[str, float]:
+    """POST /score_batch with batch_size readings, in-process"""
+    payload = [
+        {"temperature_c": 21.0 + i % 5, "humidity_pct": 60.0, "sound_db": 50.0}
+        for i in range(batch_size)
+    ]
+    times = timed(lambda: client.post("/score_batch", json=payload), 5)
+    return {
+        "median_ms": 1_000 * statistics.median(times),
+        "readings_per_s": batch_size / statistics.median(times),
+    }
+
+
+def bench_model_load(repeat: int) -> dict[str, float]:
+    """joblib.load of MODEL_FILE, then the configured inference engine build"""
+    load_times = timed(lambda: joblib.load(api.MODEL_FILE), repeat)
+    model = joblib.load(api.MODEL_FILE)
+    with quiet():
+        engine_times = timed(lambda: load_engine(model, api.INFERENCE_ENGINE), repeat)
+    return {
+        "joblib_load_ms": 1_000 * statistics.median(load_times),
+        "engine_build_ms": 1_000 * statistics.median(engine_times),
+    }
+
+
+def bench_generate(workdir: Path, n_rows: int) -> dict[str, float]:
+    """generate_all into a CSV"""
+    with quiet():
+        times = timed(lambda: generate_all(str(workdir / "gen.csv"), n_rows), 3)
+    return {"rows_per_s": n_rows / statistics.median(times)}
+
+
+def bench_train(workdir: Path, n_rows: int) -> dict[str, float]:
+    """train_model on n_rows of generated data: wall time & peak (traced) memory"""
+    data_file = str(workdir / f"train-{n_rows}.csv")
+    with quiet():
+        generate_all(data_file, n_rows)
+    tracemalloc.start()
+    start = time.perf_counter()
+    with quiet():
+        train_model(data_file, str(workdir / "model.joblib"))
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"wall_s": seconds, "peak_mb": peak / 2**20}
+
+
+def bench_recent_scores(client: TestClient, n_events: int) -> dict[str, float]:
+    """GET /recent_scores?limit=n_events, on a history filled with n_events"""
+    saved = api.RECENT_SCORES
+    rng = np.random.default_rng(0)
+    api.RECENT_SCORES = ScoreRing(n_events)
+    api.RECENT_SCORES.append(
+        time.time_ns(),
+        rng.normal((21, 60, 50), 5, (n_events, 3)),
+        rng.random(n_events) < 0.01,
+        rng.normal(0.2, 0.05, n_events),
+    )
+    try:
+        times = timed(lambda: client.get(f"/recent_scores?limit={n_events}"), 5)
+    finally:
+        api.RECENT_SCORES = saved
+    return {
+        "median_ms": 1_000 * statistics.median(times),
+        "events_per_s": n_events / statistics.median(times),
+    }
+
+
+def bench_score_store(workdir: Path, n_events: int) -> dict[str, float]:
+    """
+    ScoreStore: n_events appended in batches of 100 (as /score_batch traffic would),
+    until all are on disk; then 1,000-event time-range queries on that log
+    """
+    rng = np.random.default_rng(0)
+    features = rng.normal((21, 60, 50), 5, (100, 3))
+    is_anomaly = rng.random(100) < 0.01
+    scores = rng.normal(0.2, 0.05, 100)
+    store = ScoreStore(str(workdir / "scores.db"))
+    store.start()
+    first = time.time_ns()
+    start = time.perf_counter()
+    for _ in range(n_events // 100):
+        store.append(time.time_ns(), features, is_anomaly, scores)
+    store.stop()  # returns once everything queued is written
+    seconds = time.perf_counter() - start
+    last = time.time_ns()
+
+    starts = rng.integers(first, last, 20).tolist()
+    times = timed(lambda: store.query(starts.pop(), last, 1_000), 20)
+    return {
+        "events_per_s": store.n_written / seconds,
+        "dropped": float(store.n_dropped),
+        "query_1000_ms": 1_000 * statistics.median(times),
+    }
+
+
+def bench_engine(
+    kind: str, n_rows: int, drift: bool, one_by_one: int
+) -> dict[str, float]:
+    """
+    scores n_rows of sim.py data, in order, with a fresh engine of MODEL_FILE
+    drift: temperature & humidity follow a slow seasonal cycle (not in the training
+    data); anomalies are sim.py's (every TRAINING_ANOMALY_EVERY-th row)
+    throughput: batches of 100 rows, and the first one_by_one rows 1 at a time
+    """
+    X = generate_block(np.random.default_rng(0), 0, n_rows)
+    if drift:
+        season = np.sin(2 * np.pi * np.arange(n_rows) / n_rows)
+        X[:, 0] += 8 * season  # degrees
+        X[:, 1] += 15 * season  # % humidity
+    labels = np.arange(n_rows) % TRAINING_ANOMALY_EVERY == 0
+
+    def fresh() -> Engine:
+        with quiet():
+            return load_engine(joblib.load(api.MODEL_FILE), kind)
+
+    engine = fresh()
+    single = timed(lambda: engine.score(X[:1]), one_by_one)
+    engine = fresh()
+    start = time.perf_counter()
+    flags = np.concatenate(
+        [engine.score(X[i : i + 100])[0] for i in range(0, n_rows, 100)]
+    )
+    seconds = time.perf_counter() - start
+    hits = np.count_nonzero(flags & labels)
+    return {
+        "single_readings_per_s": one_by_one / sum(single),
+        "batch_readings_per_s": n_rows / seconds,
+        "precision": hits / max(np.count_nonzero(flags), 1),
+        "recall": hits / np.count_nonzero(labels),
+    }
+
+
+def bench_flat_parity(n_rows: int) -> dict[str, float]:
+    """
+    compiles forests of max_samples FLAT_PARITY_SAMPLES (1: every tree is a single
+    leaf) on sim.py data, checks each against sklearn (as load_engine does)
+    """
+    X = generate_block(np.random.default_rng(0), 0, n_rows)
+    differing: int = 0
+    for max_samples in FLAT_PARITY_SAMPLES:
+        model = IsolationForest(
+            n_estimators=10, max_samples=max_samples, random_state=0
+        ).fit(X)
+        if verify(FlatForest.compile(model), model) > VERIFY_TOLERANCE:
+            differing += 1
+    return {"models_differing": differing}
+
+
+def run(quick: bool) -> Results:
+    """runs every benchmark, returns {benchmark: {metric: value}}"""
+    results: Results = {}
+    train_sizes = [1_000, 10_000] if quick else [1_000, 10_000, 100_000]
+    history_sizes = [150, 10_000] if quick else [150, 10_000, 1_000_000]
+
+    with TestClient(api.app) as client:
+        print("benchmark: /score")
+        results["score"] = bench_score(client, 200 if quick else 2_000)
+        for size in (100, 1_000):
+            print(f"benchmark: /score_batch ({size})")
+            results[f"score_batch_{size}"] = bench_score_batch(client, size)
+        for size in history_sizes:
+            print(f"benchmark: /recent_scores ({size})")
+            results[f"recent_scores_{size}"] = bench_recent_scores(client, size)
+
+    print("benchmark: model load")
+    results["model_load"] = bench_model_load(5 if quick else 20)
+    for kind in ("flat", "stream"):
+        for drift in (False, True):
+            name = f"engine_{kind}_{'drift' if drift else 'stationary'}"
+            print(f"benchmark: {name}")
+            results[name] = bench_engine(
+                kind, 20_000 if quick else 200_000, drift, 200 if quick else 2_000
+            )
+
+    print("benchmark: flat engine vs. sklearn")
+    results["flat_parity"] = bench_flat_parity(2_000)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        print("benchmark: generate_all")
+        results["generate_all"] = bench_generate(workdir, 10_000 if quick else 100_000)
+        print("benchmark: score store")
+        results["score_store"] = bench_score_store(
+            workdir, 100_000 if quick else 1_000_000
+        )
+        for size in train_sizes:
+            print(f"benchmark: train_model ({size} rows)")
+            results[f"train_{size}"] = bench_train(workdir, size)
+    return results
+
+
+def compare(results: Results, baseline: Results, threshold: float) -> list[str]:
+    """
+    metrics that regressed more than threshold (relative) vs. the baseline
+    a lower-is-better metric that was 0 (e.g. dropped events) regresses when above 0
+    """
+    regressions: list[str] = []
+    for bench, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(bench, {}).get(metric)
+            if old is None:  # new metric
+                continue
+            higher_is_better = metric.endswith(HIGHER_IS_BETTER)
+            if old == 0:
+                if not higher_is_better and value > 0:
+                    regressions.append(f"{bench}.{metric}: 0 -> {value:.4g}")
+                continue
+            if higher_is_better:
+                change = (old - value) / old
+            else:
+                change = (value - old) / old
+            line = f"{bench}.{metric}: {old:.4g} -> {value:.4g} ({change:+.1%} worse)"
+            if change > threshold:
+                regressions.append(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="offline benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="results JSON file")
+    parser.add_argument("--baseline", help="results JSON of an earlier run")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    results = run(args.quick)
+    report = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "engine": api.INFERENCE_ENGINE,
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(json.dumps(results, indent=2))
+    print(f"results saved into {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"REGRESSIONS (> {args.threshold:.0%}) vs. {args.baseline}:")
+            print("\n".join(regressions))
+            sys.exit(1)
+        print(f"no regression > {args.threshold:.0%} vs. {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
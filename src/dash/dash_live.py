@@ -3,8 +3,9 @@ Monitoring dashboard for the sensor data and anomaly detection
 reads environment variable API_URL, but defaults to http://127.0.0.1:8000
 """
 
+import json
 import time
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from os import getenv
 
 import pandas as pd
@@ -15,6 +16,15 @@ import streamlit as st
 # API_URL: str = "http://127.0.0.1:8000"
 API_URL: str = getenv("API_URL", default="http://127.0.0.1:8000")
 REFRESH_INTERVAL: int = 5  # seconds
+LIVE_ROWS: int = 50  # events shown in the live table
+CHART_POINTS: int = 500  # points in the chart, whatever its time window
+PUSH_REDRAW_INTERVAL: float = 0.5  # seconds, min. between 2 table redraws (push mode)
+CHART_WINDOWS: dict[str, timedelta] = {
+    "last 15 minutes": timedelta(minutes=15),
+    "last hour": timedelta(hours=1),
+    "last 8 hours (shift)": timedelta(hours=8),
+    "last 24 hours": timedelta(hours=24),
+}
 
 
 def highlight_anomalies(row: pd.Series):
@@ -32,7 +42,7 @@ st.set_page_config(
 
 st.title("Anomaly Monitor Dashboard")
 st.caption(f"API at {API_URL}")
-st.caption(f"with /status, /score, /recent_scores")
+st.caption(f"with /status, /score, /recent_scores, /scores/downsample")
 
 st.sidebar.header("System Health")
 
@@ -61,6 +71,10 @@ st.sidebar.caption("dashboard (streamlit) connected to FastAPI (/status, /score)
 
 if "history" not in st.session_state:
     st.session_state.history = []
+if "live_frame" not in st.session_state:
+    # events fetched so far (newest LIVE_ROWS), and the cursor for the next fetch
+    st.session_state.live_frame = pd.DataFrame()
+    st.session_state.live_seq = 0
 
 col_left, col_right = st.columns(2)
 
@@ -80,7 +94,13 @@ with col_left:
             "sound_db": float(c_sound),
         }
         try:
-            resp = requests.post(f"{API_URL}/score", json=payload, timeout=3)
+            # interactive: scored ahead of the sensors' bulk traffic
+            resp = requests.post(
+                f"{API_URL}/score",
+                json=payload,
+                headers={"X-Priority": "interactive"},
+                timeout=3,
+            )
             if resp.status_code != 200:
                 st.error(f" API ERROR: {resp.status_code}")
                 st.code(resp.text)
@@ -119,66 +139,167 @@ with col_left:
 # AUTOMATIC GRAPHING AND RECENT HISTORY SHOWN HERE: RIGHT COL
 with col_right:
     st.subheader("History & live tracking from API (UTC time)")
-    live_mode = st.checkbox(
-        f"Auto-update (every {REFRESH_INTERVAL} seconds)", value=True
-    )
+    live_mode = st.checkbox("Auto-update", value=True)
+    push_mode = st.radio(
+        "Updates",
+        [f"polling (every {REFRESH_INTERVAL} s)", "push (Server-Sent Events)"],
+        horizontal=True,
+    ).startswith("push")
+    anomalies_only = push_mode and st.checkbox("push only anomalies", value=False)
+    chart_window = st.selectbox("Chart", list(CHART_WINDOWS), index=1)
 
     chart_placeholder = st.empty()
     table_placeholder = st.empty()
 
-    def render_live_view():
+    def fetch_live_frame() -> pd.DataFrame:
+        """
+        fetches only the events after the last one seen (?after=seq), appends them
+        to the cached frame; starts over if the API restarted (its seq went back)
+        with "push only anomalies", only the anomalies of them are kept
+        """
+        state = st.session_state
+        resp = requests.get(
+            f"{API_URL}/recent_scores",
+            params={"limit": LIVE_ROWS, "after": state.live_seq},
+            timeout=2,
+        )
+        resp.raise_for_status()
+        last_seq = int(resp.headers.get("X-Last-Seq", 0))
+        if last_seq < state.live_seq:
+            state.live_frame, state.live_seq = pd.DataFrame(), 0
+            return fetch_live_frame()
+        new = resp.json()
+        if new:
+            df_new = pd.DataFrame(new)
+            df_new["timestamp"] = pd.to_datetime(df_new["timestamp"])
+            df_new = df_new.set_index("timestamp")
+            state.live_seq = int(df_new["seq"].iloc[-1])
+            if anomalies_only:
+                df_new = df_new[df_new["is_anomaly"]]
+            state.live_frame = pd.concat([state.live_frame, df_new]).tail(LIVE_ROWS)
+        return state.live_frame
+
+    def fetch_chart_series() -> pd.Series:
+        """
+        anomaly_score over the chosen window, downsampled by the API (LTTB)
+        to CHART_POINTS, so 24 hours cost as much to fetch & draw as 15 minutes
+        """
+        start = datetime.now(timezone.utc) - CHART_WINDOWS[chart_window]
+        resp = requests.get(
+            f"{API_URL}/scores/downsample",
+            params={"start": start.isoformat(), "points": CHART_POINTS},
+            timeout=5,
+        )
+        resp.raise_for_status()
+        points = pd.DataFrame(resp.json(), columns=["timestamp", "anomaly_score"])
+        points["timestamp"] = pd.to_datetime(points["timestamp"])
+        return points.set_index("timestamp")["anomaly_score"]
+
+    def render_live_view(redraw: bool = True, chart: bool = True):
+        """
+        redraw: also when there are no new events (placeholders are empty)
+        chart: also refetch the chart (else: only the table is redrawn)
+        """
         try:
-            resp = requests.get(f"{API_URL}/recent_scores?limit=50", timeout=2)
-            if resp.status_code == 200:
-                recent = resp.json()
-                if recent:
-                    df_live = pd.DataFrame(recent)
-                    df_live["timestamp"] = pd.to_datetime(df_live["timestamp"])
-                    df_live = df_live.set_index("timestamp")
-
-                    chart_placeholder.line_chart(df_live["anomaly_score"])
-
-                    # table_placeholder.markdown("#### Latest events (UTC)")
-
-                    df_latest = df_live.sort_index(ascending=False).head(50)
-                    red_latest = df_latest.style.apply(highlight_anomalies, axis=1)
-
-                    # st.dataframe(
-                    #    red_latest,
-                    #    width="stretch",
-                    # )
-                    with table_placeholder.container():
-                        st.markdown("#### Latest events (UTC) / live")
-                        st.dataframe(
-                            red_latest,
-                            width="stretch",
-                            height=600,
-                        )
-
-                    # table_placeholder.dataframe(
-                    #    df_live.sort_index(ascending=False).head(50),
-                    #    width="stretch",
-                    # )
-                else:
-                    chart_placeholder.empty()
-                    table_placeholder.info(
-                        "No recent scores yet. Connect stream (sim) to see live data."
+            seen = st.session_state.live_seq
+            df_live = fetch_live_frame() if chart else st.session_state.live_frame
+            if not redraw and st.session_state.live_seq == seen:
+                return  # nothing new: keep the chart & table as they are
+            if not df_live.empty:
+                if chart:
+                    chart_placeholder.line_chart(fetch_chart_series())
+
+                # table_placeholder.markdown("#### Latest events (UTC)")
+
+                df_latest = df_live.drop(columns="seq").iloc[::-1]
+                red_latest = df_latest.style.apply(highlight_anomalies, axis=1)
+
+                # st.dataframe(
+                #    red_latest,
+                #    width="stretch",
+                # )
+                with table_placeholder.container():
+                    st.markdown("#### Latest events (UTC) / live")
+                    st.dataframe(
+                        red_latest,
+                        width="stretch",
+                        height=600,
                     )
+
+                # table_placeholder.dataframe(
+                #    df_live.sort_index(ascending=False).head(50),
+                #    width="stretch",
+                # )
             else:
                 chart_placeholder.empty()
-                table_placeholder.error(
-                    f"Could not fetch recent scores: {resp.status_code}"
+                table_placeholder.info(
+                    "No recent scores yet. Connect stream (sim) to see live data."
                 )
+        except requests.exceptions.HTTPError as e:
+            chart_placeholder.empty()
+            table_placeholder.error(
+                f"Could not fetch recent scores: {e.response.status_code}"
+            )
         except requests.exceptions.RequestException as e:
             chart_placeholder.empty()
             table_placeholder.error("API Error (recent scores).")
             table_placeholder.write(str(e))
 
-    if live_mode:
+    def follow_event_stream():
+        """
+        push mode: appends events to the cached frame as GET /events sends them,
+        redraws the table at most every PUSH_REDRAW_INTERVAL and the chart every
+        REFRESH_INTERVAL; reconnects (after a poll to fill the gap) if the API drops
+        """
+        state = st.session_state
+        while True:
+            render_live_view()  # catch up on what was missed (?after=seq)
+            try:
+                with requests.get(
+                    f"{API_URL}/events",
+                    params={"anomalies_only": anomalies_only},
+                    stream=True,
+                    timeout=(3, 60),  # > the API's keepalive interval
+                ) as resp:
+                    resp.raise_for_status()
+                    pending: list[dict] = []
+                    drawn = charted = time.monotonic()
+                    event: str = "message"
+                    for line in resp.iter_lines(decode_unicode=True):
+                        if line.startswith("event:"):  # e.g. "dropped": we lagged
+                            event = line[6:].strip()
+                        elif line.startswith("data:") and event == "message":
+                            pending.append(json.loads(line[5:]))
+                        elif not line:  # end of an event
+                            event = "message"
+                        now = time.monotonic()
+                        if pending and now - drawn >= PUSH_REDRAW_INTERVAL:
+                            df_new = pd.DataFrame(pending)
+                            df_new["timestamp"] = pd.to_datetime(df_new["timestamp"])
+                            df_new = df_new.set_index("timestamp")
+                            state.live_frame = pd.concat(
+                                [state.live_frame, df_new]
+                            ).tail(LIVE_ROWS)
+                            state.live_seq = max(
+                                state.live_seq, int(df_new["seq"].iloc[-1])
+                            )
+                            pending = []
+                            refresh_chart = now - charted >= REFRESH_INTERVAL
+                            render_live_view(chart=refresh_chart)
+                            drawn = now
+                            if refresh_chart:
+                                charted = now
+            except requests.exceptions.RequestException:
+                time.sleep(REFRESH_INTERVAL)
+
+    if live_mode and push_mode:
+        follow_event_stream()
+    elif live_mode:
         # Simple auto-refresh loop; stop via the "Stop" button in Streamlit UI
+        render_live_view()
         while True:
-            render_live_view()
             time.sleep(REFRESH_INTERVAL)
+            render_live_view(redraw=False)
     else:
         # Single snapshot
         render_live_view()
@@ -4,15 +4,42 @@ anomalous data is also generated (parameter ANOMALY_FREQUENCY) in order to test
 
 b) is also used to generate training data, with argument 'train'
 (the anomaly frequency here is set at 1%)
+with --fast (implied for .npy/.parquet output), whole blocks of rows are generated
+with NumPy and streamed to disk, for training sets of millions of rows
+
+c) with argument 'stream': sends readings as fast as (or at the rate) asked,
+over 1 persistent WebSocket connection (/ws/score), many readings per message
+
+d) with argument 'load': load generator, N virtual sensors POSTing to /score
+at a fixed total rate (open loop) over pooled keep-alive connections,
+reports throughput, errors and latency percentiles (--binary: to /score_bin)
+
+e) with argument 'binary': sends batches of readings to /score_bin, packed as
+little-endian float32 rows (no JSON either way), over 1 keep-alive connection
+
+f) with argument 'replay': sends a recorded trace (e.g. training data, or the API's
+score log) again, with its original timing at --speed times real time (0: as fast
+as possible), and compares the scores with those recorded in the trace
 """
 
+import argparse
+import asyncio
 import csv
+import json
 import random
+import sqlite3
 import sys
+import threading
 import time
+from contextlib import closing
 from os import getenv
 
+import httpx
+import numpy as np
+import pandas as pd
 import requests
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.client import connect
 
 # from datetime import datetime, timezone
 
@@ -22,6 +49,34 @@ API_URL: str = getenv("API_URL", default="http://127.0.0.1:8000")
 SLEEP_INTERVAL: int = 1
 TRAINING_FILE: str = "./src/training/sensor-training-data.csv"
 ANOMALY_FREQUENCY: int = 10  # how often to generate anomalous data
+STREAM_BATCH: int = 100  # readings per WebSocket message (stream mode)
+STREAM_IN_FLIGHT: int = 32  # messages sent but not yet answered (stream mode)
+BINARY_BATCH: int = 1_000  # readings per POST /score_bin (binary mode)
+# the API's /score_bin format: 3 float32 per reading in, score & flag per reading out
+BINARY_PREDICTION = np.dtype([("anomaly_score", "<f4"), ("is_anomaly", "u1")])
+REPLAY_BATCH: int = 1_000  # max. readings per request (replay mode)
+REPLAY_ROWS: int = 86_400  # replay without a trace: 1 day of readings, 1 per second
+# replay: a score further than this from the recorded one is a mismatch
+REPLAY_TOLERANCE: float = 1e-9
+REPLAY_TOLERANCE_BINARY: float = 1e-6  # /score_bin: readings & scores are float32
+LOAD_CONNECTIONS: int = 64  # keep-alive connection pool size (load mode)
+TRAINING_ANOMALY_EVERY: int = 100  # training data: every 100th row, i.e. 1%
+BLOCK_ROWS: int = 1_000_000  # rows generated & written at once (--fast)
+
+FEATURES: list[str] = ["temperature_c", "humidity_pct", "sound_db"]
+# columns of a replayed trace (the API's score log), only FEATURES are required
+TRACE_COLUMNS: list[str] = ["timestamp", *FEATURES, "is_anomaly", "anomaly_score"]
+# (mean, standard deviation) of each sensor
+NORMAL_READING: dict[str, tuple[float, float]] = {
+    "temperature_c": (21, 2),
+    "humidity_pct": (60, 5),
+    "sound_db": (50, 5),
+}
+ANOMALOUS_READING: dict[str, tuple[float, float]] = {
+    "temperature_c": (80, 2),
+    "humidity_pct": (10, 5),
+    "sound_db": (90, 5),
+}
 
 
 def generate_single(is_anomaly: bool = False) -> dict[str, float]:
@@ -29,19 +84,11 @@ def generate_single(is_anomaly: bool = False) -> dict[str, float]:
     input: is_anomaly (bool)
     output: 3 sensor values in 1 dict
     """
-    if is_anomaly:
-        # pass
-        return {
-            "temperature_c": round(random.gauss(80, 2), 3),
-            "humidity_pct": round(random.gauss(10, 5), 3),
-            "sound_db": round(random.gauss(90, 5), 3),
-        }
-    else:
-        return {
-            "temperature_c": round(random.gauss(21, 2), 3),
-            "humidity_pct": round(random.gauss(60, 5), 3),
-            "sound_db": round(random.gauss(50, 5), 3),
-        }
+    reading = ANOMALOUS_READING if is_anomaly else NORMAL_READING
+    return {
+        name: round(random.gauss(mean, std), 3)
+        for name, (mean, std) in reading.items()
+    }
 
 
 def generate_all(filename: str, n_rows: int = 1_000):
@@ -63,13 +110,80 @@ def generate_all(filename: str, n_rows: int = 1_000):
         writer.writeheader()
 
         for i in range(n_rows):
-            is_anomaly = True if i % 100 == 0 else False  # creating 1% abnormals
+            # creating 1% abnormals
+            is_anomaly = True if i % TRAINING_ANOMALY_EVERY == 0 else False
             data = generate_single(is_anomaly=is_anomaly)
             writer.writerow(data)
 
     print("finished")
 
 
+def generate_block(rng: np.random.Generator, start: int, n_rows: int) -> np.ndarray:
+    """
+    vectorized generate_single for rows start .. start + n_rows of a data set
+    same distributions, and the same anomalies (every TRAINING_ANOMALY_EVERY-th row)
+    output: (n_rows, 3) array, columns as in FEATURES, rounded to 3 decimals
+    """
+    normal = np.array([NORMAL_READING[f] for f in FEATURES])
+    anomalous = np.array([ANOMALOUS_READING[f] for f in FEATURES])
+    block = rng.normal(normal[:, 0], normal[:, 1], size=(n_rows, len(FEATURES)))
+    first = -start % TRAINING_ANOMALY_EVERY  # 1st anomaly in this block
+    anomalies = np.arange(first, n_rows, TRAINING_ANOMALY_EVERY)
+    block[anomalies] = rng.normal(
+        anomalous[:, 0], anomalous[:, 1], size=(anomalies.size, len(FEATURES))
+    )
+    return np.round(block, 3)
+
+
+def generate_all_fast(
+    filename: str,
+    n_rows: int = 1_000,
+    seed: int | None = None,
+    block_rows: int = BLOCK_ROWS,
+):
+    """
+    vectorized generate_all: blocks of rows are generated with NumPy and streamed
+    to disk, so memory stays bounded whatever n_rows is
+    the output format follows the file extension:
+        .csv: same layout as generate_all
+        .npy: (n_rows, 3) float64, column-major (each sensor contiguous), mmap-able
+        .parquet: 1 row group per block
+    seed: for reproducible data sets (same seed & block_rows: same data)
+    """
+    print(f"generate {n_rows} of training data, into {filename} ({seed=})")
+    rng = np.random.default_rng(seed)
+    blocks = (
+        (start, generate_block(rng, start, min(block_rows, n_rows - start)))
+        for start in range(0, n_rows, block_rows)
+    )
+
+    if filename.endswith(".npy"):
+        out = np.lib.format.open_memmap(
+            filename, mode="w+", shape=(n_rows, len(FEATURES)), fortran_order=True
+        )
+        for start, block in blocks:
+            out[start : start + len(block)] = block
+        out.flush()
+        del out
+    elif filename.endswith(".parquet"):
+        import pyarrow as pa  # only needed for Parquet
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(name, pa.float64()) for name in FEATURES])
+        with pq.ParquetWriter(filename, schema) as writer:
+            for _, block in blocks:
+                writer.write_table(
+                    pa.Table.from_arrays(list(block.T), schema=schema)
+                )
+    else:
+        with open(filename, mode="w", newline="") as f:
+            f.write(",".join(FEATURES) + "\n")
+            for _, block in blocks:
+                np.savetxt(f, block, fmt="%.3f", delimiter=",")
+
+    print("finished")
+
+
 def run_simulation():
     """
     main operating mode: sending (simulated) sensor data to API endpoint
@@ -119,8 +233,498 @@ def run_simulation():
         print("\n stopping.")
 
 
-if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] == "train":
-        generate_all(TRAINING_FILE)
+def run_stream(
+    rate: float = 0, batch: int = STREAM_BATCH, duration: float | None = None
+):
+    """
+    streaming mode: sends (simulated) sensor data over 1 WebSocket connection
+    rate: readings per second (0: as fast as possible)
+    batch: readings per message; duration: seconds to run (None: until Ctrl-C)
+    """
+    ws_url: str = API_URL.replace("http", "ws", 1) + "/ws/score"
+    print("-" * 80)
+    print(f"starting stream to {ws_url} ({rate=} readings/s, {batch=})")
+    in_flight = threading.Semaphore(STREAM_IN_FLIGHT)
+    stop = threading.Event()
+    messages: int = 0  # sent by the sender
+    answered: int = 0
+
+    def send(ws) -> None:
+        nonlocal messages
+        counter: int = 0
+        start: float = time.perf_counter()
+        sent: int = 0
+        while not stop.is_set():
+            readings: list[dict[str, float]] = []
+            for _ in range(batch):
+                force_anomaly = (counter % ANOMALY_FREQUENCY == 0) and (counter > 0)
+                readings.append(generate_single(is_anomaly=force_anomaly))
+                counter = 1 if counter >= 5_000 else counter + 1
+            in_flight.acquire()
+            if stop.is_set():
+                break
+            try:
+                ws.send(json.dumps(readings))
+            except ConnectionClosed:
+                break
+            messages += 1
+            sent += batch
+            if rate > 0:  # pace to the target rate
+                ahead = sent / rate - (time.perf_counter() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    received: int = 0
+    anomalies: int = 0
+    started: float = time.perf_counter()
+    last_report: float = started
+    try:
+        with connect(ws_url) as ws:
+            sender = threading.Thread(target=send, args=(ws,), daemon=True)
+            sender.start()
+            try:
+                while duration is None or time.perf_counter() - started < duration:
+                    results = json.loads(ws.recv())
+                    answered += 1
+                    in_flight.release()
+                    if isinstance(results, dict):  # error reply
+                        print(f"ERROR in stream, API server says: {results}")
+                        continue
+                    received += len(results)
+                    anomalies += sum(r["is_anomaly"] for r in results)
+                    now = time.perf_counter()
+                    if now - last_report >= 1:
+                        print(
+                            f"scored: {received} ({received / (now - started):.0f}/s),"
+                            f" anomalies: {anomalies}"
+                        )
+                        last_report = now
+            finally:
+                # the sender ends before the connection closes (it may be waiting
+                # for a place in flight: 1 more lets it see stop)
+                stop.set()
+                in_flight.release()
+                sender.join()
+            # replies still on their way (not counted: past the duration); unread,
+            # they fill the receive queue and the close handshake times out
+            while answered < messages:
+                ws.recv(timeout=10)
+                answered += 1
+    except KeyboardInterrupt:
+        print("\n stopping.")
+    except Exception as e:
+        print(f"general stream failure: error: {e}")
+    elapsed = time.perf_counter() - started
+    print(f"total: {received} readings in {elapsed:.1f}s ({received / elapsed:.0f}/s)")
+
+
+def run_binary(
+    rate: float = 0, batch: int = BINARY_BATCH, duration: float | None = None
+):
+    """
+    binary mode: POSTs batches of (simulated) readings to /score_bin
+    rate: readings per second (0: as fast as possible)
+    batch: readings per request; duration: seconds to run (None: until Ctrl-C)
+    """
+    print("-" * 80)
+    print(f"starting binary stream to {API_URL}/score_bin ({rate=}/s, {batch=})")
+    rng = np.random.default_rng()
+    sent: int = 0
+    anomalies: int = 0
+    started: float = time.perf_counter()
+    last_report: float = started
+    try:
+        with requests.Session() as session:
+            while duration is None or time.perf_counter() - started < duration:
+                # 1% anomalies, as in the training data
+                block = generate_block(rng, sent, batch).astype("<f4")
+                resp = session.post(
+                    f"{API_URL}/score_bin",
+                    data=block.tobytes(),
+                    headers={"Content-Type": "application/octet-stream"},
+                    timeout=10,
+                )
+                if resp.status_code != 200:
+                    print(f"ERROR in binary stream, API returns {resp.status_code}")
+                    print(f"response: {resp.text}")
+                    time.sleep(SLEEP_INTERVAL)
+                    continue
+                results = np.frombuffer(resp.content, dtype=BINARY_PREDICTION)
+                sent += len(results)
+                anomalies += int(np.count_nonzero(results["is_anomaly"]))
+                now = time.perf_counter()
+                if rate > 0:  # pace to the target rate
+                    ahead = sent / rate - (now - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+                if now - last_report >= 1:
+                    print(
+                        f"scored: {sent} ({sent / (now - started):.0f}/s),"
+                        f" anomalies: {anomalies}"
+                    )
+                    last_report = now
+    except KeyboardInterrupt:
+        print("\n stopping.")
+    except requests.exceptions.RequestException as e:
+        print(f"general binary stream failure: error: {e}")
+    elapsed = time.perf_counter() - started
+    print(f"total: {sent} readings in {elapsed:.1f}s ({sent / elapsed:.0f}/s)")
+
+
+def load_trace(path: str) -> dict[str, np.ndarray]:
+    """
+    reads a recorded trace: readings (FEATURES), optionally with their "timestamp"
+    (ns since epoch, or ISO 8601 text) and the "is_anomaly" & "anomaly_score" recorded
+        .csv, .parquet, .json (records, e.g. saved from GET /scores): columns by name
+        .npy: (n, 3) readings as written by 'train' (or a structured array)
+        .db: the API's SQLite score log (SCORE_DB), in timestamp order
+    output: {column: array}, only the TRACE_COLUMNS the trace has
+    """
+    if path.endswith(".npy"):
+        data = np.load(path, mmap_mode="r")
+        if data.dtype.names is None:
+            return dict(zip(FEATURES, np.asarray(data, dtype=np.float64).T))
+        frame = pd.DataFrame({name: data[name] for name in data.dtype.names})
+    elif path.endswith(".db"):
+        with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as db:
+            frame = pd.read_sql_query(
+                f"SELECT {', '.join(TRACE_COLUMNS)} FROM scores ORDER BY timestamp", db
+            )
+    elif path.endswith(".parquet"):
+        frame = pd.read_parquet(path)
+    elif path.endswith(".json"):
+        frame = pd.read_json(path, orient="records", convert_dates=False)
+    else:
+        frame = pd.read_csv(path)
+    missing = [name for name in FEATURES if name not in frame]
+    if missing:
+        raise ValueError(f"{path} has no column {', '.join(missing)}")
+
+    trace = {name: frame[name].to_numpy() for name in TRACE_COLUMNS if name in frame}
+    if "timestamp" in trace and trace["timestamp"].dtype.kind not in "iu":
+        trace["timestamp"] = pd.to_datetime(trace["timestamp"], utc=True).as_unit("ns")
+        trace["timestamp"] = trace["timestamp"].asi8
+    return trace
+
+
+def replay_offsets(trace: dict[str, np.ndarray]) -> np.ndarray:
+    """
+    when each reading is sent, in seconds from the 1st one (at real time):
+    as recorded (never going back, for out-of-order rows), else 1 per SLEEP_INTERVAL
+    """
+    n_rows = len(trace[FEATURES[0]])
+    if "timestamp" not in trace:
+        return np.arange(n_rows, dtype=np.float64) * SLEEP_INTERVAL
+    timestamps = np.maximum.accumulate(trace["timestamp"].astype(np.int64))
+    return (timestamps - timestamps[:1]) / 1e9
+
+
+def run_replay(
+    path: str | None = None,
+    speed: float = 1,
+    batch: int = REPLAY_BATCH,
+    binary: bool = False,
+    rows: int = REPLAY_ROWS,
+    seed: int = 0,
+    tolerance: float | None = None,
+) -> int:
+    """
+    replay mode: sends the readings of a trace (path), in order, to /score_batch
+    (or /score_bin): every reading due by now (up to batch) in 1 request
+    speed: times real time, 0: as fast as possible
+    without a trace: `rows` readings generated from `seed`, 1 per second (the same
+    readings on every run, so the API's scores can be compared from run to run)
+    a 503 (overloaded) is retried after its Retry-After, other errors are skipped
+    output: number of readings missing or scored differently from the trace
+    """
+    if path:
+        trace = load_trace(path)
+        source = path
+    else:
+        readings = generate_block(np.random.default_rng(seed), 0, rows)
+        trace = dict(zip(FEATURES, readings.T))
+        source = f"{rows} generated readings ({seed=})"
+    X = np.column_stack([trace[name] for name in FEATURES]).astype(np.float64)
+    offsets = replay_offsets(trace)
+    span: float = offsets[-1] if len(offsets) else 0.0  # the trace's duration
+    due = offsets / speed if speed > 0 else np.zeros(len(X))
+    if tolerance is None:
+        tolerance = REPLAY_TOLERANCE_BINARY if binary else REPLAY_TOLERANCE
+    endpoint = "/score_bin" if binary else "/score_batch"
+    print("-" * 80)
+    print(
+        f"replaying {source} to {API_URL}{endpoint}: {len(X)} readings"
+        f" recorded over {span:.1f}s ({speed=}, {batch=})"
+    )
+
+    scores = np.full(len(X), np.nan)
+    flags = np.zeros(len(X), dtype=bool)
+    errors: dict[str, int] = {}
+    retries: int = 0
+    max_lag: float = 0.0  # how far sending fell behind the trace's timing (speed > 0)
+    started: float = time.perf_counter()
+    last_report: float = started
+    i: int = 0
+    try:
+        with requests.Session() as session:
+            while i < len(X):
+                now = time.perf_counter() - started
+                if due[i] > now:
+                    time.sleep(due[i] - now)
+                    now = due[i]
+                if speed > 0:
+                    max_lag = max(max_lag, now - due[i])
+                ready = int(np.searchsorted(due, now, side="right"))  # due by now
+                end = min(i + batch, max(i + 1, ready))
+                if binary:
+                    resp = session.post(
+                        f"{API_URL}/score_bin",
+                        data=X[i:end].astype("<f4").tobytes(),
+                        headers={"Content-Type": "application/octet-stream"},
+                        timeout=10,
+                    )
+                else:
+                    body = [dict(zip(FEATURES, row)) for row in X[i:end].tolist()]
+                    resp = session.post(f"{API_URL}/score_batch", json=body, timeout=10)
+                if resp.status_code == 503 and "Retry-After" in resp.headers:
+                    retries += 1
+                    time.sleep(float(resp.headers["Retry-After"]))
+                    continue
+                if resp.status_code != 200:
+                    key = f"HTTP {resp.status_code}"
+                    errors[key] = errors.get(key, 0) + end - i
+                elif binary:
+                    results = np.frombuffer(resp.content, dtype=BINARY_PREDICTION)
+                    scores[i:end] = results["anomaly_score"]
+                    flags[i:end] = results["is_anomaly"].astype(bool)
+                else:
+                    results = resp.json()
+                    scores[i:end] = [r["anomaly_score"] for r in results]
+                    flags[i:end] = [r["is_anomaly"] for r in results]
+                i = end
+                now = time.perf_counter()
+                if now - last_report >= 1:
+                    print(f"sent: {i}/{len(X)} ({i / (now - started):.0f}/s)")
+                    last_report = now
+    except KeyboardInterrupt:
+        print("\n stopping.")
+    except requests.exceptions.RequestException as e:
+        print(f"general replay failure: error: {e}")
+    elapsed = time.perf_counter() - started
+
+    scored = ~np.isnan(scores)
+    n_scored = int(scored.sum())
+    print(
+        f"scored: {n_scored}/{len(X)}, anomalies: {int(flags[scored].sum())},"
+        f" errors: {errors}, retries (503): {retries}\n"
+        f"throughput: {n_scored / elapsed:.0f} readings/s in {elapsed:.1f}s"
+        f" ({span / elapsed:.1f}x real time), max. lag: {1_000 * max_lag:.1f} ms"
+    )
+    if "anomaly_score" not in trace and "is_anomaly" not in trace:
+        print("the trace has no recorded scores: nothing to compare")
+        return len(X) - n_scored
+
+    mismatch = np.zeros(len(X), dtype=bool)
+    if "is_anomaly" in trace:
+        mismatch |= flags != trace["is_anomaly"].astype(bool)
+    if "anomaly_score" in trace:
+        difference = np.abs(scores - trace["anomaly_score"])
+        mismatch |= difference > tolerance
+        print(f"max. score difference: {np.nanmax(difference, initial=0):.3g}")
+    mismatch &= scored
+    print(f"mismatches: {int(mismatch.sum())} of {n_scored} ({tolerance=})")
+    for row in np.flatnonzero(mismatch)[:5]:
+        recorded = {
+            name: trace[name][row].item()
+            for name in ("is_anomaly", "anomaly_score")
+            if name in trace
+        }
+        print(
+            f"  row {row}: {dict(zip(FEATURES, X[row].tolist()))} recorded {recorded},"
+            f" replayed is_anomaly={flags[row]} anomaly_score={scores[row]}"
+        )
+    return int(mismatch.sum()) + len(X) - n_scored
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """q-th percentile (0-100) of an already sorted list (nearest rank)"""
+    if not sorted_values:
+        return float("nan")
+    rank = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+async def run_load_async(
+    sensors: int,
+    rate: float,
+    duration: float,
+    connections: int,
+    binary: bool = False,
+) -> dict[str, float | int | dict[str, int]]:
+    """
+    open-loop load: every virtual sensor sends at rate/sensors readings per second,
+    on a fixed schedule, whether or not earlier requests have been answered.
+    latency is measured from the scheduled send time, so queueing in the
+    client (e.g. waiting for a free connection) is counted as well
+    binary: each reading is POSTed to /score_bin (12 bytes) instead of /score (JSON)
+    """
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+    pending: set[asyncio.Task] = set()
+    interval: float = sensors / rate  # per sensor
+
+    limits = httpx.Limits(
+        max_connections=connections, max_keepalive_connections=connections
+    )
+    async with httpx.AsyncClient(
+        base_url=API_URL, limits=limits, timeout=10
+    ) as client:
+
+        async def send(data: dict[str, float], scheduled: float) -> None:
+            try:
+                if binary:
+                    resp = await client.post(
+                        "/score_bin",
+                        content=np.array(list(data.values()), dtype="<f4").tobytes(),
+                        headers={"Content-Type": "application/octet-stream"},
+                    )
+                else:
+                    resp = await client.post("/score", json=data)
+                if resp.status_code == 200:
+                    latencies.append(time.perf_counter() - scheduled)
+                else:
+                    key = f"HTTP {resp.status_code}"
+                    errors[key] = errors.get(key, 0) + 1
+            except httpx.HTTPError as e:
+                key = type(e).__name__
+                errors[key] = errors.get(key, 0) + 1
+
+        async def sensor(sensor_id: int, start: float) -> None:
+            counter: int = 0
+            scheduled = start + sensor_id * interval / sensors  # stagger sensors
+            while scheduled < start + duration:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                force_anomaly = (counter % ANOMALY_FREQUENCY == 0) and (counter > 0)
+                task = asyncio.create_task(
+                    send(generate_single(is_anomaly=force_anomaly), scheduled)
+                )
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                counter = 1 if counter >= 5_000 else counter + 1
+                scheduled += interval
+
+        start: float = time.perf_counter()
+        await asyncio.gather(*(sensor(i, start) for i in range(sensors)))
+        if pending:
+            await asyncio.wait(pending)
+        elapsed: float = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "sent": len(latencies) + sum(errors.values()),
+        "ok": len(latencies),
+        "errors": errors,
+        "seconds": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": 1_000 * percentile(latencies, 50),
+        "p95_ms": 1_000 * percentile(latencies, 95),
+        "p99_ms": 1_000 * percentile(latencies, 99),
+        "p999_ms": 1_000 * percentile(latencies, 99.9),
+    }
+
+
+def run_load(
+    sensors: int = 100,
+    rate: float = 1_000,
+    duration: float = 10,
+    connections: int = LOAD_CONNECTIONS,
+    binary: bool = False,
+):
+    """load generation mode: prints a report of what the API sustained"""
+    print("-" * 80)
+    endpoint: str = "/score_bin" if binary else "/score"
+    print(
+        f"load test on {API_URL}{endpoint}: {sensors} sensors, {rate} req/s in total,"
+        f" {duration}s, {connections} connections"
+    )
+    report = asyncio.run(
+        run_load_async(sensors, rate, duration, connections, binary)
+    )
+    print(
+        f"sent: {report['sent']}, ok: {report['ok']}, errors: {report['errors']}\n"
+        f"achieved throughput: {report['throughput']:.1f} req/s"
+        f" (target {rate}) in {report['seconds']:.1f}s\n"
+        f"latency ms: p50={report['p50_ms']:.2f} p95={report['p95_ms']:.2f}"
+        f" p99={report['p99_ms']:.2f} p999={report['p999_ms']:.2f}"
+    )
+
+
+def main():
+    """
+    command line: live simulation (default), training data, stream, load, binary,
+    replay (exit status 1 if readings were missed or scored differently)
+    """
+    parser = argparse.ArgumentParser(description="sensor simulator for the API")
+    modes = parser.add_subparsers(dest="mode")
+    modes.add_parser("live", help="1 reading per second via POST /score (default)")
+    train = modes.add_parser("train", help="generate training data")
+    train.add_argument("--rows", type=int, default=1_000)
+    train.add_argument("--output", default=TRAINING_FILE, help=".csv/.npy/.parquet")
+    train.add_argument("--fast", action="store_true", help="vectorized, in blocks")
+    train.add_argument("--seed", type=int, default=None, help="(with --fast)")
+    stream = modes.add_parser("stream", help="stream readings over a WebSocket")
+    stream.add_argument("--rate", type=float, default=0, help="readings/s, 0: max")
+    stream.add_argument("--batch", type=int, default=STREAM_BATCH)
+    stream.add_argument("--duration", type=float, default=None, help="seconds")
+    load = modes.add_parser("load", help="open-loop load test of POST /score")
+    load.add_argument("--sensors", type=int, default=100, help="virtual sensors")
+    load.add_argument("--rate", type=float, default=1_000, help="req/s in total")
+    load.add_argument("--duration", type=float, default=10, help="seconds")
+    load.add_argument("--connections", type=int, default=LOAD_CONNECTIONS)
+    load.add_argument("--binary", action="store_true", help="to /score_bin")
+    binary = modes.add_parser("binary", help="batches to /score_bin, no JSON")
+    binary.add_argument("--rate", type=float, default=0, help="readings/s, 0: max")
+    binary.add_argument("--batch", type=int, default=BINARY_BATCH)
+    binary.add_argument("--duration", type=float, default=None, help="seconds")
+    replay = modes.add_parser("replay", help="send a recorded trace, compare scores")
+    replay.add_argument("trace", nargs="?", help=".csv/.json/.parquet/.npy/.db")
+    replay.add_argument("--speed", type=float, default=1, help="x real time, 0: max")
+    replay.add_argument("--batch", type=int, default=REPLAY_BATCH)
+    replay.add_argument("--binary", action="store_true", help="to /score_bin")
+    replay.add_argument("--rows", type=int, default=REPLAY_ROWS, help="(no trace)")
+    replay.add_argument("--seed", type=int, default=0, help="(no trace)")
+    replay.add_argument("--tolerance", type=float, default=None, help="of scores")
+    args = parser.parse_args()
+
+    if args.mode == "train":
+        if args.fast or not args.output.endswith(".csv"):
+            generate_all_fast(args.output, args.rows, args.seed)
+        else:
+            generate_all(args.output, args.rows)
+    elif args.mode == "stream":
+        run_stream(args.rate, args.batch, args.duration)
+    elif args.mode == "load":
+        run_load(
+            args.sensors, args.rate, args.duration, args.connections, args.binary
+        )
+    elif args.mode == "binary":
+        run_binary(args.rate, args.batch, args.duration)
+    elif args.mode == "replay":
+        failed = run_replay(
+            args.trace,
+            args.speed,
+            args.batch,
+            args.binary,
+            args.rows,
+            args.seed,
+            args.tolerance,
+        )
+        sys.exit(1 if failed else 0)
     else:
         run_simulation()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+offline bulk scoring (backfills): scores a whole file of readings with the model
+the API uses (MODEL_FILE), without HTTP, as fast as the cores allow
+- the input (.csv, .npy or .parquet) is read in fixed-size chunks (train.py's
+  iter_chunks), and the chunks are scored by a pool of processes, each with the
+  engine loaded once (the flat engine memory-maps the model's cache: <model>.flat,
+  as the API & its device models, so for model.joblib the API's cache is shared)
+- results are written in input order, as soon as the next chunk in line is done:
+  at most 2 chunks per process are in memory, whatever the size of the input
+- the output (.csv or .parquet, 1 row group per chunk) has the readings with
+  is_anomaly & anomaly_score, as the API's score log (so sim.py can replay it)
+
+run from the repository root: python -m src.training.score --input ... --output ...
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.app.engine import ENGINES, Engine, load_model
+from src.training.train import FEATURE_COLS, MODEL_FILE, iter_chunks
+
+SCORE_CHUNK_ROWS: int = 100_000  # rows per chunk sent to a worker
+IN_FLIGHT_PER_WORKER: int = 2  # chunks queued or being scored, per worker
+OUTPUT_COLUMNS: list[str] = [*FEATURE_COLS, "is_anomaly", "anomaly_score"]
+
+engine: Engine | None = None  # in each worker process
+
+
+def cache_dir_of(model_file: str) -> str:
+    """the compiled model's cache next to it (model.joblib -> model.flat)"""
+    return os.path.splitext(model_file)[0] + ".flat"
+
+
+def load_worker(model_file: str, kind: str, cache_dir: str) -> None:
+    """runs in each worker process, once: loads the engine"""
+    global engine
+    engine, _ = load_model(model_file, kind, cache_dir)
+
+
+def score_chunk(X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """runs in a worker process: (is_anomaly, scores) of 1 chunk"""
+    if engine is None:
+        raise RuntimeError("worker without engine: load_worker did not run")
+    return engine.score(X)
+
+
+class ScoreWriter:
+    """appends scored chunks to a .csv or .parquet file"""
+
+    def __init__(self, output_file: str):
+        self.output_file = output_file
+        if output_file.endswith(".parquet"):
+            import pyarrow as pa  # only needed for Parquet
+            import pyarrow.parquet as pq
+
+            self.schema = pa.schema(
+                [(name, pa.float64()) for name in FEATURE_COLS]
+                + [("is_anomaly", pa.bool_()), ("anomaly_score", pa.float64())]
+            )
+            self.parquet = pq.ParquetWriter(output_file, self.schema)
+        elif output_file.endswith(".csv"):
+            self.parquet = None
+            self.csv = open(output_file, "w", newline="")
+            self.csv.write(",".join(OUTPUT_COLUMNS) + "\n")
+        else:
+            raise ValueError(f"unsupported output {output_file}, use .csv or .parquet")
+
+    def write(self, X: np.ndarray, is_anomaly: np.ndarray, scores: np.ndarray) -> None:
+        columns = [*X.T, is_anomaly, scores]
+        if self.parquet:
+            import pyarrow as pa
+
+            self.parquet.write_table(pa.Table.from_arrays(columns, schema=self.schema))
+        else:
+            frame = pd.DataFrame(dict(zip(OUTPUT_COLUMNS, columns)))
+            frame.to_csv(self.csv, header=False, index=False)
+
+    def close(self) -> None:
+        if self.parquet:
+            self.parquet.close()
+        else:
+            self.csv.close()
+
+
+def score_file(
+    input_file: str,
+    output_file: str,
+    model_file: str = MODEL_FILE,
+    kind: str = "flat",
+    workers: int | None = None,
+    chunk_rows: int = SCORE_CHUNK_ROWS,
+    cache_dir: str | None = None,
+) -> dict[str, float | int]:
+    """
+    scores every row of input_file, writes them with their scores to output_file
+    workers: processes (default: all cores); the stream engine needs 1 (in order)
+    cache_dir: of the compiled model (default: next to model_file)
+    output: report (rows, anomalies, seconds, rows/s)
+    """
+    workers = workers or os.cpu_count() or 1
+    cache_dir = cache_dir or cache_dir_of(model_file)
+    if kind == "stream" and workers > 1:
+        raise ValueError("the stream engine scores in order: use 1 worker")
+    # loaded once here first: errors show up before the pool starts, and the
+    # flat engine's cache is up to date for the workers, so they just map it
+    _, report = load_model(model_file, kind, cache_dir)
+    print(
+        f"scoring {input_file} into {output_file}: {kind} engine"
+        f" ({report['artifact']}), {workers} workers, chunks of {chunk_rows} rows"
+    )
+
+    writer = ScoreWriter(output_file)
+    n_rows: int = 0
+    n_anomalies: int = 0
+    start: float = time.perf_counter()
+    last_report: float = start
+    context = multiprocessing.get_context("spawn")  # as retrain.py
+    in_flight: deque[tuple[np.ndarray, Future[tuple[np.ndarray, np.ndarray]]]] = deque()
+
+    def write_next() -> None:
+        nonlocal n_rows, n_anomalies, last_report
+        X, future = in_flight.popleft()
+        is_anomaly, scores = future.result()
+        writer.write(X, is_anomaly, scores)
+        n_rows += len(X)
+        n_anomalies += int(np.count_nonzero(is_anomaly))
+        now = time.perf_counter()
+        if now - last_report >= 1:
+            print(f"scored: {n_rows} ({n_rows / (now - start):.0f} rows/s)")
+            last_report = now
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=load_worker,
+            initargs=(model_file, kind, cache_dir),
+        ) as pool:
+            for X in iter_chunks(input_file, chunk_rows):
+                in_flight.append((X, pool.submit(score_chunk, X)))
+                if len(in_flight) >= IN_FLIGHT_PER_WORKER * workers:
+                    write_next()  # the oldest chunk: output stays in input order
+            while in_flight:
+                write_next()
+    finally:
+        writer.close()
+
+    seconds = time.perf_counter() - start
+    result: dict[str, float | int] = {
+        "rows": n_rows,
+        "anomalies": n_anomalies,
+        "seconds": seconds,
+        "rows_per_s": n_rows / seconds if seconds else 0.0,
+    }
+    print(
+        f"scored {n_rows} rows ({n_anomalies} anomalies) in {seconds:.1f}s:"
+        f" {result['rows_per_s']:.0f} rows/s"
+    )
+    return result
+
+
+def main():
+    """command line: bulk scoring of a file"""
+    parser = argparse.ArgumentParser(description="scores a file of readings")
+    parser.add_argument("--input", required=True, help=".csv/.npy/.parquet")
+    parser.add_argument("--output", required=True, help=".csv/.parquet")
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--engine", default="flat", choices=ENGINES)
+    parser.add_argument("--workers", type=int, default=None, help="default: cores")
+    parser.add_argument("--chunk-rows", type=int, default=SCORE_CHUNK_ROWS)
+    parser.add_argument("--cache-dir", default=None, help="default: <model>.flat")
+    args = parser.parse_args()
+
+    try:
+        score_file(
+            args.input,
+            args.output,
+            args.model,
+            args.engine,
+            args.workers,
+            args.chunk_rows,
+            args.cache_dir,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
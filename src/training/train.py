@@ -1,8 +1,25 @@
 """
 trains the ML prediction model (IsolationForest) on the training data
-saves it using the common joblib structure
+saves it using the common joblib structure, with the mean & covariance of the
+training rows it finds normal (used by the API's prefilter)
+
+with --out-of-core: for inputs larger than memory (.csv, .npy or .parquet),
+the data is read in chunks, the forest is fitted on a uniform random sample
+(trees built in parallel on all cores), and the training-set stats are
+computed in 1 streaming pass: memory is bounded by chunk_rows + sample_size
+
+with --sweep: fits a grid of forests (number of trees x max_samples) in parallel
+processes, and reports for each the precision & recall on the anomalies sim.py
+injects (in held-out rows, not the ones fitted on), the API's inference latency
+and the model size, with the configurations on the Pareto front of detection
+quality vs. cost; --promote saves 1 as the model
 """
 
+import argparse
+import io
+import json
+import time
+from collections.abc import Iterator
 from typing import TYPE_CHECKING
 
 import joblib
@@ -12,13 +29,25 @@ from sklearn.ensemble import IsolationForest
 
 INPUT_FILE: str = "./src/training/sensor-training-data.csv"
 MODEL_FILE: str = "./src/training/model.joblib"
+FEATURE_COLS: list[str] = ["temperature_c", "humidity_pct", "sound_db"]
+CHUNK_ROWS: int = 1_000_000  # rows read at once (out-of-core)
+SAMPLE_SIZE: int = 256_000  # rows the forest is fitted on (out-of-core)
+# --sweep: grid of configurations, and how they are compared
+SWEEP_TREES: list[int] = [10, 25, 50, 100, 200]
+SWEEP_SAMPLES: list[int] = [64, 128, 256, 512, 1024]
+ANOMALY_EVERY: int = 100  # sim.py's data: every 100th row (from row 0) is anomalous
+LATENCY_CALLS: int = 200  # single-row scoring calls timed per configuration
+LATENCY_BATCH: int = 10_000  # rows scored in 1 call, timed per configuration
+LATENCY_REPEATS: int = 5  # timings are the best of these repeats (least noise)
+HOLDOUT_SHARE: float = 0.2  # last rows, not fitted on: precision & recall are on them
+PROMOTE_SLACK: float = 0.01  # "best": the fastest with an F1 this close to the top
 
 
-def train_model():
-    """trains the ML on the input file"""
+def train_model(input_file: str = INPUT_FILE, model_file: str = MODEL_FILE):
+    """trains the ML on the input file, saves it into model_file"""
     try:
-        print(f"loading training data from {INPUT_FILE}")
-        df: pd.DataFrame = pd.read_csv(INPUT_FILE)
+        print(f"loading training data from {input_file}")
+        df: pd.DataFrame = pd.read_csv(input_file)
         feature_cols: list[str] = [
             "temperature_c",
             "humidity_pct",
@@ -40,6 +69,9 @@ def train_model():
         scores = clf.decision_function(X_train)
         n_anomalies = np.sum(y_pred == -1)
         n_normals = np.sum(y_pred == 1)
+        normal_stats = RunningStats(len(feature_cols))
+        normal_stats.update(X_train[y_pred == 1])
+        save_stats(clf, normal_stats)
 
         print("\n=== Model on training data ===")
         print(f"Normal points:  {n_normals}")
@@ -49,13 +81,373 @@ def train_model():
             f"Score stats:    min={scores.min():.3f}, max={scores.max():.3f}, mean={scores.mean():.3f}"
         )
 
-        joblib.dump(clf, MODEL_FILE)
+        joblib.dump(clf, model_file)
         print("model saved")
 
     except FileNotFoundError:
-        print(f"file not found: (inputfile) {INPUT_FILE}")
+        print(f"file not found: (inputfile) {input_file}")
         print("remember to generate it first")
 
 
+def iter_chunks(input_file: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[np.ndarray]:
+    """reads the feature columns of a .csv, .npy or .parquet file, chunk by chunk"""
+    if input_file.endswith(".npy"):
+        data = np.load(input_file, mmap_mode="r")  # only touched pages are read
+        for start in range(0, len(data), chunk_rows):
+            yield np.asarray(data[start : start + chunk_rows], dtype=np.float64)
+    elif input_file.endswith(".parquet"):
+        import pyarrow.parquet as pq  # only needed for Parquet
+
+        parquet = pq.ParquetFile(input_file)
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=FEATURE_COLS):
+            yield np.column_stack(
+                [batch.column(c).to_numpy() for c in FEATURE_COLS]
+            ).astype(np.float64)
+    else:
+        for df in pd.read_csv(input_file, usecols=FEATURE_COLS, chunksize=chunk_rows):
+            yield df[FEATURE_COLS].to_numpy(dtype=np.float64)
+
+
+class RunningStats:
+    """mean, std & covariance per column, merged chunk by chunk (Chan et al.)"""
+
+    def __init__(self, n_cols: int):
+        self.n: int = 0
+        self.mean = np.zeros(n_cols)
+        # sums of products of deviations from the mean (diagonal: squared deviations)
+        self.comoment = np.zeros((n_cols, n_cols))
+
+    def update(self, chunk: np.ndarray) -> None:
+        n_b = len(chunk)
+        if n_b == 0:
+            return
+        mean_b = chunk.mean(axis=0)
+        deviations = chunk - mean_b
+        comoment_b = deviations.T @ deviations
+        delta = mean_b - self.mean
+        n = self.n + n_b
+        self.mean = self.mean + delta * n_b / n
+        self.comoment = (
+            self.comoment + comoment_b + np.outer(delta, delta) * self.n * n_b / n
+        )
+        self.n = n
+
+    @property
+    def cov(self) -> np.ndarray:  # sample covariance, as np.cov()
+        return self.comoment / max(self.n - 1, 1)
+
+    @property
+    def std(self) -> np.ndarray:  # sample std, as pandas' .std()
+        return np.sqrt(np.diag(self.cov))
+
+
+def save_stats(clf: IsolationForest, stats: RunningStats) -> None:
+    """
+    saves mean & covariance with the model, for the API's prefilter (prefilter.py)
+    stats should be of the rows the forest finds normal: the few anomalies in the
+    training data would widen them
+    """
+    clf.feature_mean_ = stats.mean
+    clf.feature_cov_ = stats.cov
+
+
+def sample_chunks(
+    chunks: Iterator[np.ndarray], sample_size: int, rng: np.random.Generator
+) -> tuple[np.ndarray, RunningStats]:
+    """
+    1 pass: a uniform random sample of sample_size rows (keeps the rows with the
+    smallest random keys, i.e. reservoir sampling), plus per-column stats
+    """
+    stats: RunningStats | None = None
+    sample = np.empty((0, 0))
+    keys = np.empty(0)
+    for chunk in chunks:
+        if stats is None:
+            stats = RunningStats(chunk.shape[1])
+            sample = np.empty((0, chunk.shape[1]))
+        stats.update(chunk)
+        sample = np.concatenate((sample, chunk))
+        keys = np.concatenate((keys, rng.random(len(chunk))))
+        if len(keys) > sample_size:
+            keep = np.argpartition(keys, sample_size)[:sample_size]
+            sample, keys = sample[keep], keys[keep]
+    if stats is None:
+        raise ValueError("no training data")
+    return sample, stats
+
+
+def train_model_out_of_core(
+    input_file: str = INPUT_FILE,
+    model_file: str = MODEL_FILE,
+    sample_size: int = SAMPLE_SIZE,
+    chunk_rows: int = CHUNK_ROWS,
+    n_jobs: int = -1,
+    seed: int | None = None,
+):
+    """
+    trains the ML on an input file of any size, within a fixed memory budget
+    n_jobs: cores used to build the trees & score the data (-1: all)
+    """
+    try:
+        print(f"sampling {sample_size} rows of training data from {input_file}")
+        rng = np.random.default_rng(seed)
+        X_sample, stats = sample_chunks(
+            iter_chunks(input_file, chunk_rows), sample_size, rng
+        )
+        print(f"training IsolationForest on {len(X_sample)} of {stats.n} rows")
+        clf: IsolationForest = IsolationForest(
+            n_estimators=100, contamination=0.01, n_jobs=n_jobs, random_state=seed
+        )
+        clf.fit(X_sample)
+        del X_sample
+
+        print(" ### ")
+        print(" training data :")
+        for col, mean, std in zip(FEATURE_COLS, stats.mean, stats.std):
+            print(f"{col}: mean={mean:.2f}, std.s={std:.2f}")
+
+        # streaming pass over the full data set: scores, with the trees in parallel
+        n_anomalies: int = 0
+        score_min, score_max, score_sum = np.inf, -np.inf, 0.0
+        normal_stats = RunningStats(len(FEATURE_COLS))
+        with joblib.parallel_config(n_jobs=n_jobs):
+            for chunk in iter_chunks(input_file, chunk_rows):
+                scores = clf.decision_function(chunk)
+                n_anomalies += int(np.sum(scores < 0))  # as predict() == -1
+                normal_stats.update(chunk[scores >= 0])
+                score_min = min(score_min, scores.min())
+                score_max = max(score_max, scores.max())
+                score_sum += scores.sum()
+
+        print("\n=== Model on training data ===")
+        print(f"Normal points:  {stats.n - n_anomalies}")
+        print(f"Anomalies:      {n_anomalies}")
+        print(f"Anomaly ratio:  {n_anomalies / stats.n:.3f}")
+        print(
+            f"Score stats:    min={score_min:.3f}, max={score_max:.3f}, mean={score_sum / stats.n:.3f}"
+        )
+
+        save_stats(clf, normal_stats)
+        clf.set_params(n_jobs=None)  # the API scores 1 request per call
+        joblib.dump(clf, model_file)
+        print("model saved")
+
+    except FileNotFoundError:
+        print(f"file not found: (inputfile) {input_file}")
+        print("remember to generate it first")
+
+
+def injected_labels(n_rows: int) -> np.ndarray:
+    """the anomalies sim.py injects into training data (generate_all / --fast)"""
+    labels = np.zeros(n_rows, dtype=bool)
+    labels[::ANOMALY_EVERY] = True
+    return labels
+
+
+def fit_config(
+    X_fit: np.ndarray,
+    X_test: np.ndarray,
+    labels: np.ndarray,
+    n_estimators: int,
+    max_samples: int,
+    seed: int,
+) -> dict:
+    """
+    fits 1 configuration (in a worker process) on X_fit, scores it on the held-out
+    X_test against their labels; max_samples is at most len(X_fit)
+    """
+    start = time.perf_counter()
+    clf = IsolationForest(
+        n_estimators=n_estimators,
+        max_samples=max_samples,
+        contamination=0.01,
+        random_state=seed,
+    )
+    clf.fit(X_fit)
+    fit_s = time.perf_counter() - start
+    flagged = clf.predict(X_test) == -1
+    hits = int(np.sum(flagged & labels))
+    precision = hits / max(int(flagged.sum()), 1)
+    recall = hits / max(int(labels.sum()), 1)
+    pickled = io.BytesIO()
+    joblib.dump(clf, pickled)
+    return {
+        "trees": n_estimators,
+        "max_samples": clf.max_samples_,  # the one used
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if hits else 0.0,
+        "size_kb": len(pickled.getvalue()) / 1024,
+        "fit_s": fit_s,
+        "model": clf,
+    }
+
+
+def time_inference(clf: IsolationForest, X: np.ndarray) -> tuple[float, float]:
+    """
+    cost of a configuration in the API: µs per 1-reading call, and readings/s in
+    calls of LATENCY_BATCH rows, with the API's default (flat) inference engine
+    """
+    from src.app.engine import load_engine  # run as python -m src.training.train
+
+    engine = load_engine(clf)
+    rows = [row[None] for row in X[np.arange(LATENCY_CALLS) % len(X)]]
+    batch = X[np.arange(LATENCY_BATCH) % len(X)]
+    engine.score(batch[:1])  # warm-up
+    single: list[float] = []
+    batched: list[float] = []
+    for _ in range(LATENCY_REPEATS):
+        start = time.perf_counter()
+        for row in rows:
+            engine.score(row)
+        single.append((time.perf_counter() - start) / len(rows))
+        start = time.perf_counter()
+        engine.score(batch)
+        batched.append(time.perf_counter() - start)
+    return 1e6 * min(single), len(batch) / min(batched)
+
+
+def mark_pareto(results: list[dict]) -> None:
+    """marks the configurations no other one beats on both F1 & single-row latency"""
+    for r in results:
+        r["pareto"] = not any(
+            o["f1"] >= r["f1"]
+            and o["single_us"] <= r["single_us"]
+            and (o["f1"] > r["f1"] or o["single_us"] < r["single_us"])
+            for o in results
+        )
+
+
+def choose_config(results: list[dict], promote: str, n_fit: int) -> dict:
+    """
+    promote: "best" (the fastest configuration with an F1 within PROMOTE_SLACK
+    of the top one), or "<trees>x<max_samples>", e.g. "50x256"
+    (max_samples above the n_fit rows fitted on is n_fit, as in the sweep)
+    """
+    if promote == "best":
+        top = max(r["f1"] for r in results)
+        candidates = [r for r in results if r["f1"] >= top - PROMOTE_SLACK]
+        return min(candidates, key=lambda r: r["single_us"])
+    trees, samples = (int(value) for value in promote.split("x"))
+    for r in results:
+        if (r["trees"], r["max_samples"]) == (trees, min(samples, n_fit)):
+            return r
+    raise ValueError(f"{promote} is not in the sweep")
+
+
+def sweep(
+    input_file: str = INPUT_FILE,
+    trees: list[int] = SWEEP_TREES,
+    samples: list[int] = SWEEP_SAMPLES,
+    n_jobs: int = -1,
+    seed: int = 0,
+    promote: str | None = None,
+    model_file: str = MODEL_FILE,
+    report_file: str | None = None,
+) -> list[dict]:
+    """
+    fits every trees x samples configuration, n_jobs processes at once (-1: all
+    cores); the data set is loaded once, and memory-mapped by joblib into the
+    workers rather than copied (if larger than 1 MB); the inference timings are
+    taken afterwards, 1 configuration at a time, so they don't compete for cores
+    the forests are fitted on the first rows, and precision & recall measured on
+    the last HOLDOUT_SHARE of them (the promoted model is fitted on the first rows)
+    labels: every ANOMALY_EVERY-th row, so the input should come from sim.py
+    """
+    X = np.concatenate(list(iter_chunks(input_file)))
+    labels = injected_labels(len(X))
+    n_fit = len(X) - int(len(X) * HOLDOUT_SHARE)
+    if n_fit == len(X) or n_fit == 0:
+        raise ValueError(f"{len(X)} rows: too few to hold some out")
+    # max_samples is at most the rows fitted on: larger ones are the same config
+    samples = sorted({min(max_samples, n_fit) for max_samples in samples})
+    print(
+        f"sweeping {len(trees)}x{len(samples)} configurations on {len(X)} rows"
+        f" of {input_file}: fitted on {n_fit}, tested on {len(X) - n_fit}"
+        f" ({labels[n_fit:].sum()} injected anomalies)"
+    )
+    results: list[dict] = joblib.Parallel(n_jobs=n_jobs)(
+        joblib.delayed(fit_config)(
+            X[:n_fit], X[n_fit:], labels[n_fit:], n_estimators, max_samples, seed
+        )
+        for n_estimators in trees
+        for max_samples in samples
+    )
+    for r in results:
+        r["single_us"], r["batch_rows_per_s"] = time_inference(r["model"], X)
+    mark_pareto(results)
+
+    print(
+        f"{'trees':>6} {'samples':>7} {'precision':>9} {'recall':>6} {'f1':>6}"
+        f" {'1 row µs':>9} {'batch rows/s':>12} {'size kB':>8} {'fit s':>6}  pareto"
+    )
+    for r in sorted(results, key=lambda r: r["single_us"]):
+        print(
+            f"{r['trees']:>6} {r['max_samples']:>7} {r['precision']:>9.3f}"
+            f" {r['recall']:>6.3f} {r['f1']:>6.3f} {r['single_us']:>9.1f}"
+            f" {r['batch_rows_per_s']:>12.0f} {r['size_kb']:>8.0f} {r['fit_s']:>6.2f}"
+            f"  {'*' if r['pareto'] else ''}"
+        )
+    if report_file:
+        with open(report_file, "w") as f:
+            rows = [{k: v for k, v in r.items() if k != "model"} for r in results]
+            json.dump(rows, f, indent=2)
+        print(f"report saved in {report_file}")
+
+    if promote:
+        chosen = choose_config(results, promote, n_fit)
+        clf: IsolationForest = chosen["model"]
+        normal_stats = RunningStats(X.shape[1])
+        normal_stats.update(X[clf.predict(X) == 1])
+        save_stats(clf, normal_stats)
+        joblib.dump(clf, model_file)
+        print(
+            f"promoted {chosen['trees']} trees x {chosen['max_samples']} samples"
+            f" (f1={chosen['f1']:.3f}, {chosen['single_us']:.1f} µs) to {model_file}"
+        )
+    return results
+
+
+def main():
+    """command line: in-memory training (default), out-of-core, or sweep"""
+    parser = argparse.ArgumentParser(description="trains the IsolationForest")
+    parser.add_argument("--input", default=INPUT_FILE, help=".csv/.npy/.parquet")
+    parser.add_argument("--output", default=MODEL_FILE)
+    parser.add_argument("--out-of-core", action="store_true", help="chunked")
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--jobs", type=int, default=-1, help="cores, -1: all")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--sweep", action="store_true", help="grid of configurations")
+    parser.add_argument("--trees", default=",".join(map(str, SWEEP_TREES)))
+    parser.add_argument("--max-samples", default=",".join(map(str, SWEEP_SAMPLES)))
+    parser.add_argument("--promote", default=None, help='"best" or e.g. "50x256"')
+    parser.add_argument("--report", default=None, help="sweep results, as JSON")
+    args = parser.parse_args()
+
+    if args.sweep:
+        sweep(
+            args.input,
+            [int(value) for value in args.trees.split(",")],
+            [int(value) for value in args.max_samples.split(",")],
+            args.jobs,
+            0 if args.seed is None else args.seed,
+            args.promote,
+            args.output,
+            args.report,
+        )
+    elif args.out_of_core:
+        train_model_out_of_core(
+            args.input,
+            args.output,
+            args.sample_size,
+            args.chunk_rows,
+            args.jobs,
+            args.seed,
+        )
+    else:
+        train_model(args.input, args.output)
+
+
 if __name__ == "__main__":
-    train_model()
+    main()
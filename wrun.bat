@@ -1 +1 @@
-uv run uvicorn src.app.main:app --reload --host 0.0.0.0 --port 8000
+uv run uvicorn src.app.main:app --reload --host 0.0.0.0 --port 8000 --timeout-graceful-shutdown 5